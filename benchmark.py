@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+from game.game import Game
+from constants.fen import STARTING_BOARD, KIWIPETE, POSITION3, POSITION4, POSITION5
+from game.moves import move_to_uci
+from game.profiler import Profiler, TRACE_MODE, SAMPLE_MODE
+from perft import perft, PERFT_RESULTS
+from players.minimax_player_v0 import ComputerPlayer as ComputerPlayerV0
+from players.minimax_player_v1 import ComputerPlayer as ComputerPlayerV1
+
+
+# (name, fen, perft depth, search depth)
+BENCHMARK_POSITIONS = [
+  ('startpos', STARTING_BOARD, 4, 5),
+  ('kiwipete', KIWIPETE, 3, 4),
+  ('position3', POSITION3, 4, 5),
+  ('position4', POSITION4, 3, 4),
+  ('position5', POSITION5, 3, 4),
+]
+
+ENGINES = {
+  'v0': ComputerPlayerV0,
+  'v1': ComputerPlayerV1,
+}
+
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# a benchmark counts as a regression when its speed drops by more than this fraction of the baseline
+REGRESSION_TOLERANCE = 0.10
+
+SEARCH_TRANSPOSITION_TABLE_MB = 16
+
+
+# positions the make/undo and move generation micro-benchmarks run on, and how many rounds
+MICRO_BENCHMARK_POSITIONS = [('startpos', STARTING_BOARD), ('kiwipete', KIWIPETE)]
+MICRO_BENCHMARK_ROUNDS = 2000
+
+# engines also searched with copy-make instead of make/undo, to compare the two
+COPY_MAKE_ENGINES = ('v1',)
+
+
+def load_position(fen, copy_make=False):
+  game = Game()
+  game.load_fen(fen)
+  game.copy_make = copy_make
+  return game
+
+
+def run_perft_benchmark(fen, depth, copy_make=False):
+  game = load_position(fen, copy_make)
+  nodes = perft(game, depth)
+
+  expected = PERFT_RESULTS.get(fen)
+  if expected and depth <= len(expected) and nodes != expected[depth - 1]:
+    raise AssertionError(f"perft({depth}) returned {nodes}, expected {expected[depth - 1]}")
+
+  return {'nodes': nodes}
+
+
+def run_make_undo_benchmark(fen, rounds):
+  """Make and undo every legal move of the position `rounds` times; a node is one make/undo pair."""
+  game = load_position(fen)
+  moves = game.get_legal_moves()
+  make_move = game.make_move
+  undo_move = game.undo_move
+
+  for _ in range(rounds):
+    for move in moves:
+      make_move(move)
+      undo_move()
+
+  return {'nodes': rounds * len(moves)}
+
+
+def run_move_generation_benchmark(fen, rounds):
+  """Generate the pseudo-legal moves of the position `rounds` times; a node is one generation."""
+  game = load_position(fen)
+  moves = game.move_buffers[0]
+  generate_moves = game.generate_moves
+
+  for _ in range(rounds):
+    generate_moves(moves)
+
+  return {'nodes': rounds}
+
+
+def run_search_benchmark(fen, depth, engine, copy_make=False):
+  """Iterative deepening up to depth; the per-iteration SearchStats are returned under 'stats'."""
+  game = load_position(fen, copy_make)
+  computer = ENGINES[engine](None, SEARCH_TRANSPOSITION_TABLE_MB)
+  move, score, stats = computer.search(game, game.current_player_color == 0, max_depth=depth)
+
+  return {
+    'nodes': computer.moves_evaluated + computer.quiescence_moves_evaluated,
+    'move': move_to_uci(move) if move != None else None,
+    'score': score,
+    'effective_branching_factor': stats.effective_branching_factor(),
+    'stats': stats,
+  }
+
+
+def measure(function, *args, repeat=1, memory=True):
+  """Run a benchmark `repeat` times and keep the fastest, then once more under tracemalloc for peak memory.
+
+  Tracing slows everything down several times over, so it never runs during a timed pass.
+  """
+  best_time = None
+  for _ in range(repeat):
+    start_time = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start_time
+    best_time = elapsed if best_time == None else min(best_time, elapsed)
+
+  result['seconds'] = round(best_time, 4)
+  result['nodes_per_second'] = round(result['nodes'] / best_time, 1) if best_time else 0
+
+  if memory:
+    tracemalloc.start()
+    function(*args)
+    result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+  return result
+
+
+def run_suite(engines=('v0', 'v1'), repeat=1, memory=True, only=None, verbose=True, stats_output=None):
+  benchmarks = []
+  for name, fen in MICRO_BENCHMARK_POSITIONS:
+    benchmarks.append((f"make-undo/{name}", run_make_undo_benchmark, (fen, MICRO_BENCHMARK_ROUNDS)))
+    benchmarks.append((f"movegen/{name}", run_move_generation_benchmark, (fen, MICRO_BENCHMARK_ROUNDS)))
+
+  for name, fen, perft_depth, search_depth in BENCHMARK_POSITIONS:
+    benchmarks.append((f"perft/{name}/d{perft_depth}", run_perft_benchmark, (fen, perft_depth)))
+    benchmarks.append((f"perft-copy-make/{name}/d{perft_depth}", run_perft_benchmark, (fen, perft_depth, True)))
+    for engine in engines:
+      benchmarks.append((f"search-{engine}/{name}/d{search_depth}", run_search_benchmark, (fen, search_depth, engine)))
+      if engine in COPY_MAKE_ENGINES:
+        benchmarks.append(
+          (f"search-{engine}-copy-make/{name}/d{search_depth}", run_search_benchmark, (fen, search_depth, engine, True))
+        )
+
+  results = {}
+  for benchmark_name, function, args in benchmarks:
+    if only and only not in benchmark_name:
+      continue
+
+    result = measure(function, *args, repeat=repeat, memory=memory)
+    stats = result.pop('stats', None)
+    if stats and stats_output:
+      stats.write_json_lines(stats_output, benchmark=benchmark_name)
+    results[benchmark_name] = result
+    if verbose:
+      memory_text = f", {result['peak_memory_bytes'] / 1024:.0f} KiB peak" if memory else ""
+      print(f"{benchmark_name:<36} {result['nodes']:>9} nodes {result['seconds']:>8.2f}s "
+            f"{result['nodes_per_second']:>10.0f} nodes/s{memory_text}")
+
+  return results
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+  """Print the change against each baseline benchmark and return the names of those that regressed.
+
+  A different node count isn't a speed regression, but it means the search or move generation
+  changed behaviour, so it is reported alongside.
+  """
+  regressions = []
+  print("\n--- Compared to baseline ---")
+  for name, result in results.items():
+    previous = baseline['results'].get(name)
+    if not previous:
+      print(f"{name:<36} new")
+      continue
+
+    change = result['nodes_per_second'] / previous['nodes_per_second'] - 1 if previous['nodes_per_second'] else 0
+    notes = []
+    if change < -tolerance:
+      regressions.append(name)
+      notes.append("REGRESSION")
+    if result['nodes'] != previous['nodes']:
+      notes.append(f"nodes {previous['nodes']} -> {result['nodes']}")
+    if 'peak_memory_bytes' in result and 'peak_memory_bytes' in previous:
+      memory_change = result['peak_memory_bytes'] / max(previous['peak_memory_bytes'], 1) - 1
+      notes.append(f"memory {memory_change * 100:+.1f}%")
+
+    print(f"{name:<36} {change * 100:+6.1f}% nodes/s {' '.join(notes)}")
+
+  return regressions
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Run the perft and search benchmark suite.")
+  parser.add_argument('-o', '--output', help="write the results to this JSON file")
+  parser.add_argument('--baseline', default=BASELINE_FILE, help=f"baseline to compare against (default: {BASELINE_FILE})")
+  parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+  parser.add_argument('--engine', action='append', choices=list(ENGINES), help="engines to search with (default: all)")
+  parser.add_argument('--only', help="run only the benchmarks whose name contains this")
+  parser.add_argument('--repeat', type=int, default=1, help="runs per benchmark, the fastest is kept")
+  parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+  parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+  parser.add_argument('--stats-output', help="append the per-iteration search statistics to this JSON lines file")
+  parser.add_argument('--profile', choices=[TRACE_MODE, SAMPLE_MODE], help="profile the suite (timings are then not comparable)")
+  parser.add_argument('--profile-output', help="write a Chrome trace (trace) or collapsed stacks (sample) here")
+  args = parser.parse_args(argv)
+
+  if args.profile:
+    Profiler.enable(args.profile)
+
+  results = run_suite(args.engine or list(ENGINES), args.repeat, not args.no_memory, args.only, stats_output=args.stats_output)
+
+  if Profiler.is_enabled():
+    Profiler.print_profile_summary(sum(result['nodes'] for result in results.values()))
+    if args.profile_output and Profiler.mode == TRACE_MODE:
+      Profiler().export_chrome_trace(args.profile_output)
+    elif args.profile_output:
+      Profiler().export_collapsed_stacks(args.profile_output)
+    Profiler.disable()
+  report = {
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'results': results,
+  }
+
+  if args.output:
+    with open(args.output, 'w') as file:
+      json.dump(report, file, indent=2)
+
+  regressions = []
+  if args.save_baseline:
+    with open(args.baseline, 'w') as file:
+      json.dump(report, file, indent=2)
+    print(f"\nBaseline saved to {args.baseline}")
+  elif os.path.exists(args.baseline):
+    with open(args.baseline) as file:
+      regressions = compare_to_baseline(results, json.load(file), args.tolerance)
+
+  return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -12,6 +12,9 @@ PIECE_BLACK_BISHOP = 9
 PIECE_BLACK_KNIGHT = 10
 PIECE_BLACK_PAWN = 11
 
+# marks an empty square in the board's mailbox
+EMPTY_SQUARE = 12
+
 PIECE_VALUES = {
   'K': 20000,
   'Q': 900,
@@ -72,6 +75,8 @@ SQUARES_MAP = {
   56: 'a1', 57: 'b1', 58: 'c1', 59: 'd1', 60: 'e1', 61: 'f1', 62: 'g1', 63: 'h1'
 }
 
+SQUARE_INDICES = {name: square for square, name in SQUARES_MAP.items()}
+
 PAWN_PS_TABLE = [
   0, 0, 0, 0, 0, 0, 0, 0,
   50, 50, 50, 50, 50, 50, 50, 50,
@@ -145,4 +150,20 @@ PIECE_SQUARE_TABLES = {
   'R': ROOK_PS_TABLE,
   'Q': QUEEN_PS_TABLE,
   'K': KING_PS_TABLE
-}
\ No newline at end of file
+}
+
+# Signed evaluation terms per piece type and square, from white's point of view, so a board can
+# keep a running score by adding the entry of every piece that arrives and subtracting it when it leaves.
+# Black reads the tables mirrored, the same way players.helper.evaluate_board does.
+MATERIAL_SCORES = [
+  PIECE_VALUES[PIECE_NAMES[piece_type].upper()] * (1 if piece_type < 6 else -1)
+  for piece_type in range(12)
+]
+
+POSITIONAL_SCORES = [
+  [
+    PIECE_SQUARE_TABLES[PIECE_NAMES[piece_type].upper()][square if piece_type < 6 else 63 - square] * (1 if piece_type < 6 else -1)
+    for square in range(64)
+  ]
+  for piece_type in range(12)
+]
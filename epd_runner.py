@@ -0,0 +1,172 @@
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from game.game import Game
+from game.moves import move_to_uci
+from players.minimax_player_v0 import ComputerPlayer as ComputerPlayerV0
+from players.minimax_player_v1 import ComputerPlayer as ComputerPlayerV1
+
+
+ENGINES = {
+  'v0': ComputerPlayerV0,
+  'v1': ComputerPlayerV1,
+}
+
+DEFAULT_TRANSPOSITION_TABLE_MB = 16
+
+# positions submitted to the pool ahead of the one being written out, per worker
+IN_FLIGHT_PER_WORKER = 2
+
+
+def read_epd_lines(file):
+  """Yield (line number, line) for every position in an EPD or FEN file, skipping blanks and # comments."""
+  for line_number, line in enumerate(file, 1):
+    line = line.strip()
+    if line and not line.startswith('#'):
+      yield (line_number, line)
+
+
+def strip_annotations(san):
+  return san.rstrip('+#!?')
+
+
+# per-process state, created once by the pool initializer and reused for every position
+_worker_game = None
+_worker_player = None
+
+
+def init_worker(engine, transposition_table_mb):
+  global _worker_game, _worker_player
+  _worker_game = Game()
+  _worker_player = ENGINES[engine](None, transposition_table_mb)
+
+
+def solve_position(line_number, line, max_time, max_depth):
+  """Search one EPD line with the worker's game and player, returning a JSON-ready result."""
+  game = _worker_game
+  player = _worker_player
+  result = {'line': line_number}
+
+  try:
+    operations = game.load_epd(line)
+  except (ValueError, KeyError) as error:
+    result['error'] = f"Invalid position: {error}"
+    return result
+
+  player.transposition_table.clear()
+  nodes_before = player.moves_evaluated + player.quiescence_moves_evaluated
+
+  start_time = time.perf_counter()
+  search_result = player.iterative_deepening(game, game.current_player_color == 0, max_time=max_time, max_depth=max_depth)
+  elapsed = time.perf_counter() - start_time
+  nodes = player.moves_evaluated + player.quiescence_moves_evaluated - nodes_before
+
+  result.update({
+    'id': operations.get('id', [None])[0],
+    'fen': game.get_fen(),
+    'depth': player.completed_depth,
+    'nodes': nodes,
+    'elapsed': round(elapsed, 4),
+    'nodes_per_second': round(nodes / elapsed, 1) if elapsed else None,
+  })
+
+  if not search_result or search_result[0] == None:
+    result['move'] = None
+    return result
+
+  move, score = search_result
+  san = game.move_to_san(move)
+  result.update({'move': move_to_uci(move), 'san': san, 'score': score})
+
+  # bm/am operands are SAN; compare without check marks and annotations
+  if 'bm' in operations:
+    result['bm'] = operations['bm']
+    result['solved'] = strip_annotations(san) in {strip_annotations(bm) for bm in operations['bm']}
+  if 'am' in operations:
+    result['am'] = operations['am']
+    result['solved'] = result.get('solved', True) and strip_annotations(san) not in {strip_annotations(am) for am in operations['am']}
+
+  return result
+
+
+def run_suite(lines, output, engine='v1', workers=1, max_time=None, max_depth=64,
+              transposition_table_mb=DEFAULT_TRANSPOSITION_TABLE_MB):
+  """Solve every (line number, line) pair, writing one JSON line per position in input order.
+
+  Lines are pulled from the iterable only as workers free up, so memory stays bounded however
+  long the file is. Returns (positions, solved, positions with a bm/am operation).
+  """
+  summary = {'positions': 0, 'solved': 0, 'tested': 0, 'nodes': 0, 'elapsed': 0.0}
+
+  def write_result(result):
+    output.write(json.dumps(result) + '\n')
+    output.flush()
+    summary['positions'] += 1
+    summary['nodes'] += result.get('nodes', 0)
+    summary['elapsed'] += result.get('elapsed', 0)
+    if 'solved' in result:
+      summary['tested'] += 1
+      summary['solved'] += result['solved']
+
+  if workers <= 1:
+    init_worker(engine, transposition_table_mb)
+    for line_number, line in lines:
+      write_result(solve_position(line_number, line, max_time, max_depth))
+    return summary
+
+  with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(engine, transposition_table_mb)) as executor:
+    pending = deque()
+    for line_number, line in lines:
+      pending.append(executor.submit(solve_position, line_number, line, max_time, max_depth))
+      if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+        write_result(pending.popleft().result())
+
+    while pending:
+      write_result(pending.popleft().result())
+
+  return summary
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Run an EPD test suite through the engine, writing JSON lines.")
+  parser.add_argument('epd_file', help="EPD or FEN file, one position per line ('-' for stdin)")
+  parser.add_argument('-o', '--output', help="JSON lines output file (default: stdout)")
+  parser.add_argument('--engine', choices=list(ENGINES), default='v1')
+  parser.add_argument('-j', '--workers', type=int, default=1)
+  parser.add_argument('-t', '--time', type=float, help="seconds per position")
+  parser.add_argument('-d', '--depth', type=int, help="maximum depth per position")
+  parser.add_argument('--hash', type=int, default=DEFAULT_TRANSPOSITION_TABLE_MB, help="transposition table MB per worker")
+  args = parser.parse_args(argv)
+
+  if args.time == None and args.depth == None:
+    parser.error("give a time (-t) or depth (-d) limit")
+
+  input_file = sys.stdin if args.epd_file == '-' else open(args.epd_file)
+  output_file = open(args.output, 'w') if args.output else sys.stdout
+
+  try:
+    summary = run_suite(
+      read_epd_lines(input_file), output_file, args.engine, args.workers,
+      max_time=args.time, max_depth=args.depth or 64, transposition_table_mb=args.hash
+    )
+  finally:
+    if input_file is not sys.stdin:
+      input_file.close()
+    if output_file is not sys.stdout:
+      output_file.close()
+
+  nodes_per_second = summary['nodes'] / summary['elapsed'] if summary['elapsed'] else 0
+  print(
+    f"{summary['positions']} positions, solved {summary['solved']}/{summary['tested']}, "
+    f"{summary['nodes']} nodes, {nodes_per_second:.0f} nodes/s per worker",
+    file=sys.stderr
+  )
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
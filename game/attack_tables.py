@@ -0,0 +1,106 @@
+from game.precomputed_moves import direction_offsets, num_squares_to_edge
+
+# Attack lookup tables, built once when the module is first imported.
+#
+# Leapers (knights, kings, pawns) get one attack bitboard per square. Sliders use hashed
+# lookups in the spirit of PEXT bitboards: the occupancy is masked down to the squares that
+# can block the piece (its rays minus the board edge), and the masked value indexes a
+# per-square table holding the attack bitboard for exactly that set of blockers.
+
+ROOK_DIRECTIONS = range(0, 4)
+BISHOP_DIRECTIONS = range(4, 8)
+
+
+def ray_attacks(square, directions, occupancy):
+  """Walk each ray from square up to and including the first occupied square."""
+  attacks = 0
+  for direction in directions:
+    target = square
+    for _ in range(num_squares_to_edge[square][direction]):
+      target += direction_offsets[direction]
+      attacks |= (1 << target)
+      if (occupancy >> target) & 1:
+        break
+
+  return attacks
+
+
+def blocker_mask(square, directions):
+  """Squares on the rays of square that can block a slider; the last square of each ray never can."""
+  mask = 0
+  for direction in directions:
+    target = square
+    for _ in range(num_squares_to_edge[square][direction] - 1):
+      target += direction_offsets[direction]
+      mask |= (1 << target)
+
+  return mask
+
+
+def leaper_attacks(square, offsets, max_col_distance):
+  attacks = 0
+  for offset in offsets:
+    target = square + offset
+    if 0 <= target < 64 and abs(target % 8 - square % 8) <= max_col_distance:
+      attacks |= (1 << target)
+
+  return attacks
+
+
+def build_slider_table(directions):
+  masks = []
+  tables = []
+  for square in range(64):
+    mask = blocker_mask(square, directions)
+    table = {}
+
+    # enumerate every subset of the mask (Carry-Rippler trick)
+    blockers = 0
+    while True:
+      table[blockers] = ray_attacks(square, directions, blockers)
+      blockers = (blockers - mask) & mask
+      if blockers == 0:
+        break
+
+    masks.append(mask)
+    tables.append(table)
+
+  return masks, tables
+
+
+def build_between_table():
+  """For every pair of squares on a common line, the squares strictly between them (0 otherwise)."""
+  table = [[0] * 64 for _ in range(64)]
+  for square in range(64):
+    for direction in range(8):
+      between = 0
+      target = square
+      for _ in range(num_squares_to_edge[square][direction]):
+        target += direction_offsets[direction]
+        table[square][target] = between
+        between |= (1 << target)
+
+  return table
+
+
+KNIGHT_ATTACKS = [leaper_attacks(square, [-17, -15, -10, -6, 6, 10, 15, 17], 2) for square in range(64)]
+KING_ATTACKS = [leaper_attacks(square, [-9, -8, -7, -1, 1, 7, 8, 9], 1) for square in range(64)]
+
+# indexed by color, then square: white pawns capture towards row 0, black pawns towards row 7
+PAWN_ATTACKS = [
+  [leaper_attacks(square, [-9, -7], 1) for square in range(64)],
+  [leaper_attacks(square, [7, 9], 1) for square in range(64)],
+]
+
+ROOK_MASKS, ROOK_ATTACKS = build_slider_table(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_ATTACKS = build_slider_table(BISHOP_DIRECTIONS)
+
+SQUARES_BETWEEN = build_between_table()
+
+
+def rook_attacks(square, occupancy):
+  return ROOK_ATTACKS[square][occupancy & ROOK_MASKS[square]]
+
+
+def bishop_attacks(square, occupancy):
+  return BISHOP_ATTACKS[square][occupancy & BISHOP_MASKS[square]]
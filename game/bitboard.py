@@ -1,45 +1,215 @@
-from constants.pieces import PIECE_MAPPING, PIECE_NAMES
-from game.precomputed_moves import direction_offsets, PrecomputeMoveData
+from constants.pieces import PIECE_MAPPING, PIECE_NAMES, EMPTY_SQUARE, MATERIAL_SCORES, POSITIONAL_SCORES, SQUARES_MAP, SQUARE_INDICES
+from game.moves import FEN_CASTLING_RIGHTS, ALL_CASTLING_RIGHTS, CASTLING_PATHS, FLAG_EN_PASSANT
+from game.board_state import BoardState
+from game.attack_tables import (
+  KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_MASKS, ROOK_ATTACKS, BISHOP_MASKS, BISHOP_ATTACKS,
+  SQUARES_BETWEEN, rook_attacks, bishop_attacks
+)
+from game.zobrist import ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_EN_PASSANT, ZOBRIST_CASTLING
 from game.profiler import Profiler
 
 
+ALL_SQUARES = (1 << 64) - 1
+
+# piece values for static exchange evaluation, indexed by piece type
+SEE_VALUES = [abs(score) for score in MATERIAL_SCORES]
+
+
 class Board:
+  __slots__ = (
+    'bitboard', 'mailbox', 'all_pieces', 'pieces_by_color', 'attacks_from', 'attacking_squares',
+    'castling_rights', 'black_king_pos', 'white_king_pos', 'en_passant_square', 'zobrist_key',
+    'material_score', 'positional_score',
+  )
+
   def __init__(self):
     # Bitboard representation: 12 arrays (6 white, 6 black)
     self.bitboard = [0] * 12  # Index 0-5 = White pieces, 6-11 = Black pieces
-    self.num_squares_to_edge = PrecomputeMoveData()
+    self.mailbox = bytearray([EMPTY_SQUARE] * 64)  # piece type on each square, kept in sync by set_bit/clear_bit
 
     self.all_pieces = 0
     self.pieces_by_color = [0, 0]
-    self.black_attacking_squares = set()
-    self.white_attacking_squares = set()
 
-    self.king_castling_squares = set([4, 60])
-    self.rook_castling_squares = set([0, 7, 56, 63])
+    # attack bitboards: squares attacked by the piece on each square, and by each color as a whole
+    self.attacks_from = [0] * 64
+    self.attacking_squares = [0, 0]
+
+    # one bit per castling right, see CASTLE_WHITE_KINGSIDE and friends in game.moves
+    self.castling_rights = ALL_CASTLING_RIGHTS
     self.black_king_pos = 4
     self.white_king_pos = 60
 
     # if a pawn moves 2 tiles in one turn, this will store its position until another move is played
     self.en_passant_square = None
 
+    # position hash, kept up to date by Game as moves are made and undone
+    self.zobrist_key = 0
+
+    # running evaluation terms (white's point of view), kept up to date by Game the same way
+    self.material_score = 0
+    self.positional_score = 0
+
   def setup_starting_pieces_from_fen(self, fen):
-    """Set up the pieces on the bitboard based on the FEN string."""
-    row = 0
-    for fen_row in fen.split('/'):
-      col = 0
-      for char in fen_row:
-        if char.isdigit():
-          # Empty squares (represented by numbers in FEN)
-          col += int(char)
-        else:
-          piece_type = self.get_piece_type(char)
-          bit_index = row * 8 + col
-          self.set_bit(piece_type, bit_index)
-          col += 1
-      row += 1
+    """Set up the position from a FEN string, returning (side to move, halfmove clock, fullmove number).
+
+    Fields missing from the end default to white to move, no castling, no en passant, 0 and 1,
+    so a bare placement field or the first four fields of an EPD line work too.
+    """
+    fields = fen.split()
+    color = 1 if len(fields) > 1 and fields[1] == 'b' else 0
+    castling = fields[2] if len(fields) > 2 else '-'
+    en_passant = fields[3] if len(fields) > 3 else '-'
+    halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    fullmove_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+
+    bitboard = [0] * 12
+    mailbox = bytearray([EMPTY_SQUARE] * 64)
+    square = 0
+    for char in fields[0]:
+      piece_type = PIECE_MAPPING.get(char)
+      if piece_type != None:
+        bitboard[piece_type] |= 1 << square
+        mailbox[square] = piece_type
+        square += 1
+      elif char != '/':
+        # Empty squares (represented by numbers in FEN)
+        square += int(char)
+
+    if square != 64:
+      raise ValueError(f"Invalid FEN placement: {fields[0]}")
+
+    self.bitboard = bitboard
+    self.mailbox = mailbox
+
+    self.castling_rights = 0
+    for char in castling:
+      self.castling_rights |= FEN_CASTLING_RIGHTS.get(char, 0)
+
+    # FEN names the square behind the pawn that just moved two squares, the board tracks the pawn
+    self.en_passant_square = None
+    if en_passant != '-':
+      target_square = SQUARE_INDICES[en_passant]
+      self.en_passant_square = target_square + 8 if color == 0 else target_square - 8
+
+    self.refresh_derived_state(color)
+    return (color, halfmove_clock, fullmove_number)
+
+  def to_fen(self, color, halfmove_clock=0, fullmove_number=1):
+    """Write the position as a FEN string, with `color` as the side to move."""
+    rows = []
+    for row_start in range(0, 64, 8):
+      row = ''
+      empty = 0
+      for piece_type in self.mailbox[row_start:row_start + 8]:
+        if piece_type == EMPTY_SQUARE:
+          empty += 1
+          continue
+        if empty:
+          row += str(empty)
+          empty = 0
+        row += PIECE_NAMES[piece_type]
+      rows.append(row + str(empty) if empty else row)
+
+    castling = ''.join(char for char, right in FEN_CASTLING_RIGHTS.items() if self.castling_rights & right)
+
+    if self.en_passant_square != None:
+      en_passant = SQUARES_MAP[self.en_passant_square - 8 if color == 0 else self.en_passant_square + 8]
+    else:
+      en_passant = '-'
+
+    return f"{'/'.join(rows)} {'wb'[color]} {castling or '-'} {en_passant} {halfmove_clock} {fullmove_number}"
+
+  def setup_from_bitboards(self, bitboards, en_passant_square, castling_rights, color):
+    """Set up a position from its 12 bitboards and rights, e.g. a snapshot sent to another process."""
+    self.bitboard = list(bitboards)
+    self.mailbox = bytearray([EMPTY_SQUARE] * 64)
+    for piece_type in range(12):
+      pieces = self.bitboard[piece_type]
+      while pieces:
+        self.mailbox[(pieces & -pieces).bit_length() - 1] = piece_type
+        pieces &= pieces - 1
+
+    self.en_passant_square = en_passant_square
+    self.castling_rights = castling_rights
+    self.refresh_derived_state(color)
+
+  def get_state(self):
+    """Copy the position, attack maps, hash and scores into a BoardState."""
+    state = BoardState()
+    state.bitboard = self.bitboard[:]
+    state.mailbox = bytes(self.mailbox)
+    state.all_pieces = self.all_pieces
+    state.pieces_by_color = self.pieces_by_color[:]
+    state.attacks_from = self.attacks_from[:]
+    state.attacking_squares = self.attacking_squares[:]
+    state.white_king_pos = self.white_king_pos
+    state.black_king_pos = self.black_king_pos
+    state.castling_rights = self.castling_rights
+    state.en_passant_square = self.en_passant_square
+    state.zobrist_key = self.zobrist_key
+    state.material_score = self.material_score
+    state.positional_score = self.positional_score
+    return state
+
+  def set_state(self, state):
+    """Put back a position saved by get_state, copying into the existing containers."""
+    self.bitboard[:] = state.bitboard
+    self.mailbox[:] = state.mailbox
+    self.all_pieces = state.all_pieces
+    self.pieces_by_color = state.pieces_by_color[:]
+    self.attacks_from[:] = state.attacks_from
+    self.attacking_squares[:] = state.attacking_squares
+    self.white_king_pos = state.white_king_pos
+    self.black_king_pos = state.black_king_pos
+    self.castling_rights = state.castling_rights
+    self.en_passant_square = state.en_passant_square
+    self.zobrist_key = state.zobrist_key
+    self.material_score = state.material_score
+    self.positional_score = state.positional_score
+
+  def refresh_derived_state(self, color):
+    """Recompute occupancy, attacks, hash and scores once the bitboards and rights are in place."""
     self.all_pieces = sum(self.bitboard)
     self.pieces_by_color = [sum(self.bitboard[:6]), sum(self.bitboard[6:])]
     self.get_attacking_squares()
+    self.zobrist_key = self.compute_zobrist_key(color)
+    self.material_score, self.positional_score = self.compute_evaluation_scores()
+
+  def compute_zobrist_key(self, color):
+    """Hash the position from scratch, with `color` as the side to move."""
+    key = ZOBRIST_BLACK_TO_MOVE if color == 1 else 0
+
+    pieces = self.all_pieces
+    while pieces:
+      square = (pieces & -pieces).bit_length() - 1
+      key ^= ZOBRIST_PIECES[self.mailbox[square]][square]
+      pieces &= pieces - 1
+
+    if self.en_passant_square != None:
+      key ^= ZOBRIST_EN_PASSANT[self.en_passant_square]
+
+    key ^= ZOBRIST_CASTLING[self.castling_rights]
+
+    return key
+
+  def compute_evaluation_scores(self):
+    """Sum the material and piece-square scores of every piece from scratch."""
+    material_score = 0
+    positional_score = 0
+
+    pieces = self.all_pieces
+    while pieces:
+      square = (pieces & -pieces).bit_length() - 1
+      piece_type = self.mailbox[square]
+      material_score += MATERIAL_SCORES[piece_type]
+      positional_score += POSITIONAL_SCORES[piece_type][square]
+      pieces &= pieces - 1
+
+    return material_score, positional_score
+
+  def evaluate(self):
+    """Static evaluation from the running scores, equal to players.helper.evaluate_board."""
+    return self.material_score + self.positional_score
 
   def get_piece_type(self, piece_char):
     """Map piece characters to bitboard indices."""
@@ -49,11 +219,14 @@ class Board:
     """Set a bit for a given piece at the board index."""
     if piece_type is not None:
       self.bitboard[piece_type] |= (1 << index)
+      self.mailbox[index] = piece_type
 
   def clear_bit(self, piece_type, index):
     """Clear a bit for a given piece at the board index."""
     if piece_type is not None:
       self.bitboard[piece_type] &= ~(1 << index)
+      if self.mailbox[index] == piece_type:
+        self.mailbox[index] = EMPTY_SQUARE
 
   def get_bit(self, piece_type, index):
     """Get the bit for a given piece at the board index."""
@@ -70,20 +243,13 @@ class Board:
         if self.get_bit(piece_type, square):
           print(f"Piece: {PIECE_NAMES[piece_type]} at square {i}")
 
-  @Profiler.profile_function
   def get_square_piece(self, index):
-    for piece_type in range(12):
-      if self.bitboard[piece_type] & (1 << index):
-        return piece_type
-    
-    return None
+    piece_type = self.mailbox[index]
+    return None if piece_type == EMPTY_SQUARE else piece_type
 
   def is_attacked(self, color, index):
-    if color == 0:  # player is white, check which squares black attacks
-      return index in self.black_attacking_squares
-
-    if color == 1:  # player is black, check which squares white attacks
-      return index in self.white_attacking_squares
+    """Check if the opponent of `color` attacks the square at index."""
+    return (self.attacking_squares[1 - color] >> index) & 1
 
   def is_occupied(self, index):
     return (self.all_pieces >> index) & 1  # 1 if occupied, 0 if empty
@@ -93,25 +259,242 @@ class Board:
 
   @Profiler.profile_function
   def get_attacking_squares(self):
-    self.white_attacking_squares.clear()
-    self.black_attacking_squares.clear()
+    """Rebuild the attack bitboards of every piece from scratch."""
+    self.attacks_from = [0] * 64
 
-    for square in range(64):
-      piece_type = self.get_square_piece(square)
-      if piece_type != None:
-        piece_color = 0 if piece_type < 6 else 1
+    pieces = self.all_pieces
+    while pieces:
+      square = (pieces & -pieces).bit_length() - 1
+      piece_type = self.mailbox[square]
+      if piece_type == 0:
+        self.white_king_pos = square
 
-        if piece_type == 0:
-          self.white_king_pos = square
+      if piece_type == 6:
+        self.black_king_pos = square
 
-        if piece_type == 6:
-          self.black_king_pos = square
+      self.attacks_from[square] = self.get_piece_attacks(piece_type, square)
+      pieces &= pieces - 1
 
-        moves = self.generate_moves(piece_type, square)
-        if piece_color == 0:
-          self.white_attacking_squares.update(moves)
-        if piece_color == 1:
-          self.black_attacking_squares.update(moves)
+    self.update_color_attacks()
+
+  @Profiler.profile_function
+  def update_attacking_squares(self, changed_squares):
+    """Refresh the attack bitboards after the occupants of `changed_squares` (a bitboard) changed.
+
+    Only pieces standing on a changed square and sliding pieces whose rays run through one
+    of them can attack different squares than before, everything else is left untouched.
+    """
+    attacks_from = self.attacks_from
+    bitboard = self.bitboard
+    mailbox = self.mailbox
+
+    sliders = (bitboard[1] | bitboard[2] | bitboard[3] | bitboard[7] | bitboard[8] | bitboard[9]) & ~changed_squares
+    while sliders:
+      square = (sliders & -sliders).bit_length() - 1
+      if attacks_from[square] & changed_squares:
+        attacks_from[square] = self.get_sliding_attacks(mailbox[square], square)
+      sliders &= sliders - 1
+
+    while changed_squares:
+      square = (changed_squares & -changed_squares).bit_length() - 1
+      piece_type = mailbox[square]
+      attacks_from[square] = 0 if piece_type == EMPTY_SQUARE else self.get_piece_attacks(piece_type, square)
+      changed_squares &= changed_squares - 1
+
+    self.update_color_attacks()
+
+  def update_color_attacks(self):
+    """Combine the per-piece attack bitboards into one attack bitboard per color."""
+    attacks_from = self.attacks_from
+
+    for color in range(2):
+      attacks = 0
+      pieces = self.pieces_by_color[color]
+      while pieces:
+        attacks |= attacks_from[(pieces & -pieces).bit_length() - 1]
+        pieces &= pieces - 1
+      self.attacking_squares[color] = attacks
+
+  def get_piece_attacks(self, piece_type, position):
+    """Get the bitboard of squares a piece attacks, regardless of what stands on them."""
+    # called for every changed square of every move, so the type checks are inlined
+    kind = piece_type if piece_type < 6 else piece_type - 6
+    if 1 <= kind <= 3:
+      return self.get_sliding_attacks(piece_type, position)
+
+    if kind == 5:
+      return PAWN_ATTACKS[0 if piece_type < 6 else 1][position]
+
+    if kind == 4:
+      return KNIGHT_ATTACKS[position]
+
+    return KING_ATTACKS[position]
+
+  def get_sliding_attacks(self, piece_type, position):
+    """Look up the rays of a sliding piece up to and including the first blocker of either color."""
+    kind = piece_type if piece_type < 6 else piece_type - 6
+    if kind == 2:
+      return ROOK_ATTACKS[position][self.all_pieces & ROOK_MASKS[position]]
+    if kind == 3:
+      return BISHOP_ATTACKS[position][self.all_pieces & BISHOP_MASKS[position]]
+
+    return ROOK_ATTACKS[position][self.all_pieces & ROOK_MASKS[position]] | BISHOP_ATTACKS[position][self.all_pieces & BISHOP_MASKS[position]]
+
+  def get_legal_move_masks(self, color):
+    """Work out what constrains the moves of `color`, once per position.
+
+    Returns (check mask, pin rays, king danger): the squares any non-king move must land on
+    (everything when not in check, the checker and the squares between it and the king in
+    single check, nothing in double check), the line each pinned piece is confined to by
+    square, and the squares the king can't step onto, counting the ones behind it on the line
+    of a sliding checker.
+    """
+    bitboard = self.bitboard
+    king_pos = self.white_king_pos if color == 0 else self.black_king_pos
+    enemy = 6 if color == 0 else 0
+    enemy_rooks = bitboard[enemy + 1] | bitboard[enemy + 2]
+    enemy_bishops = bitboard[enemy + 1] | bitboard[enemy + 3]
+    all_pieces = self.all_pieces
+
+    king_danger = self.attacking_squares[1 - color]
+    check_mask = ALL_SQUARES
+
+    if (king_danger >> king_pos) & 1:
+      rook_checkers = rook_attacks(king_pos, all_pieces) & enemy_rooks
+      bishop_checkers = bishop_attacks(king_pos, all_pieces) & enemy_bishops
+      checkers = (
+        rook_checkers | bishop_checkers
+        | (KNIGHT_ATTACKS[king_pos] & bitboard[enemy + 4])
+        | (PAWN_ATTACKS[color][king_pos] & bitboard[enemy + 5])
+      )
+
+      if checkers & (checkers - 1):
+        check_mask = 0
+      else:
+        check_mask = checkers | SQUARES_BETWEEN[king_pos][checkers.bit_length() - 1]
+
+      # a sliding checker still attacks the squares behind the king once it steps away
+      without_king = all_pieces ^ (1 << king_pos)
+      while rook_checkers:
+        king_danger |= rook_attacks((rook_checkers & -rook_checkers).bit_length() - 1, without_king)
+        rook_checkers &= rook_checkers - 1
+      while bishop_checkers:
+        king_danger |= bishop_attacks((bishop_checkers & -bishop_checkers).bit_length() - 1, without_king)
+        bishop_checkers &= bishop_checkers - 1
+
+    # sliders that would see the king if only enemy pieces blocked: one own piece between pins it
+    own_pieces = self.pieces_by_color[color]
+    enemy_pieces = self.pieces_by_color[1 - color]
+    pinners = (rook_attacks(king_pos, enemy_pieces) & enemy_rooks) | (bishop_attacks(king_pos, enemy_pieces) & enemy_bishops)
+    pin_rays = {}
+    while pinners:
+      pinner = (pinners & -pinners).bit_length() - 1
+      pinners &= pinners - 1
+      blockers = SQUARES_BETWEEN[king_pos][pinner] & own_pieces
+      if blockers and not blockers & (blockers - 1):
+        pin_rays[blockers.bit_length() - 1] = SQUARES_BETWEEN[king_pos][pinner] | (1 << pinner)
+
+    return (check_mask, pin_rays, king_danger)
+
+  def is_en_passant_legal(self, color, position):
+    """Check that taking en passant with the pawn at position doesn't leave the king attacked.
+
+    Two pawns leave the same rank at once, which can uncover a check no pin mask sees, so the
+    move is checked against the occupancy it leaves behind.
+    """
+    bitboard = self.bitboard
+    captured_square = self.en_passant_square
+    target_square = captured_square - 8 if color == 0 else captured_square + 8
+    king_pos = self.white_king_pos if color == 0 else self.black_king_pos
+    enemy = 6 if color == 0 else 0
+    occupancy = (self.all_pieces ^ (1 << position) ^ (1 << captured_square)) | (1 << target_square)
+
+    return not (
+      (rook_attacks(king_pos, occupancy) & (bitboard[enemy + 1] | bitboard[enemy + 2]))
+      | (bishop_attacks(king_pos, occupancy) & (bitboard[enemy + 1] | bitboard[enemy + 3]))
+      | (KNIGHT_ATTACKS[king_pos] & bitboard[enemy + 4])
+      | (PAWN_ATTACKS[color][king_pos] & bitboard[enemy + 5] & ~(1 << captured_square))
+    )
+
+  def attackers_to(self, square, occupancy):
+    """Bitboard of the pieces of both colors in `occupancy` attacking square, sliders seeing through anything missing from it."""
+    bitboard = self.bitboard
+    return (
+      (PAWN_ATTACKS[1][square] & bitboard[5])  # white pawns sit where a black pawn on square would attack
+      | (PAWN_ATTACKS[0][square] & bitboard[11])
+      | (KNIGHT_ATTACKS[square] & (bitboard[4] | bitboard[10]))
+      | (KING_ATTACKS[square] & (bitboard[0] | bitboard[6]))
+      | (rook_attacks(square, occupancy) & (bitboard[1] | bitboard[2] | bitboard[7] | bitboard[8]))
+      | (bishop_attacks(square, occupancy) & (bitboard[1] | bitboard[3] | bitboard[7] | bitboard[9]))
+    ) & occupancy
+
+  def see(self, move):
+    """Static exchange evaluation of a capture: the material it wins (negative if it loses).
+
+    Every capture and recapture on the target square is played out on bitboards, each side
+    taking back with its least valuable attacker and free to stop once going on would lose
+    more. Sliders lined up behind a piece that has just captured join in (x-rays). Nothing is
+    moved on the board itself.
+    """
+    bitboard = self.bitboard
+    from_pos = move & 63
+    target_pos = (move >> 6) & 63
+    piece_type = self.mailbox[from_pos]
+    occupancy = self.all_pieces ^ (1 << from_pos)
+
+    if move & FLAG_EN_PASSANT:
+      gains = [SEE_VALUES[5]]
+      occupancy ^= 1 << self.en_passant_square
+    else:
+      victim = self.mailbox[target_pos]
+      gains = [0 if victim == EMPTY_SQUARE else SEE_VALUES[victim]]
+
+    # the piece now standing on the square, the next one to be taken
+    on_square_value = SEE_VALUES[piece_type]
+    promotion = (move >> 12) & 15
+    if promotion:
+      gains[0] += SEE_VALUES[promotion] - SEE_VALUES[piece_type]
+      on_square_value = SEE_VALUES[promotion]
+
+    rooks = bitboard[1] | bitboard[2] | bitboard[7] | bitboard[8]
+    bishops = bitboard[1] | bitboard[3] | bitboard[7] | bitboard[9]
+    attackers = self.attackers_to(target_pos, occupancy)
+    color = 1 if piece_type < 6 else 0
+
+    while True:
+      own_attackers = attackers & self.pieces_by_color[color]
+      if not own_attackers:
+        break
+
+      # least valuable attacker first: pawn, knight, bishop, rook, queen, king
+      offset = 0 if color == 0 else 6
+      for attacker_type in range(offset + 5, offset - 1, -1):
+        candidates = own_attackers & bitboard[attacker_type]
+        if candidates:
+          break
+
+      # the king can only take back if nothing can take it in turn
+      if attacker_type == offset and attackers & self.pieces_by_color[1 - color]:
+        break
+
+      gains.append(on_square_value - gains[-1])
+      on_square_value = SEE_VALUES[attacker_type]
+      occupancy ^= candidates & -candidates
+
+      # moving a piece off the line can uncover a slider behind it
+      if attacker_type in (offset + 5, offset + 3, offset + 1):
+        attackers |= bishop_attacks(target_pos, occupancy) & bishops
+      if attacker_type in (offset + 2, offset + 1):
+        attackers |= rook_attacks(target_pos, occupancy) & rooks
+      attackers &= occupancy
+      color = 1 - color
+
+    # work back from the last capture: each side only captures if it comes out ahead
+    while len(gains) > 1:
+      last_gain = gains.pop()
+      gains[-1] = -max(-gains[-1], last_gain)
+
+    return gains[0]
 
   def is_pawn(self, piece_type):
     return piece_type == 5 or piece_type == 11
@@ -145,6 +528,7 @@ class Board:
     return moves
 
   def generate_moves(self, piece_type, position):
+    """Get the bitboard of pseudo-legal target squares for the piece at position."""
     piece_color = 0 if piece_type < 6 else 1
 
     if self.is_sliding_piece(piece_type):
@@ -161,26 +545,7 @@ class Board:
 
   @Profiler.profile_function
   def generate_sliding_moves(self, color, position):
-    moves = 0
-    piece_type = self.get_square_piece(position)
-    start_index = 4 if self.is_bishop(piece_type) else 0
-    end_index = 4 if self.is_rook(piece_type) else 8
-
-    for direction in range(start_index, end_index):
-      for i in range(self.num_squares_to_edge[position][direction]):
-        square = position + direction_offsets[direction] * (i + 1)
-
-        # blocked by friendly piece, can't move further in this direction
-        if self.is_occupied_by_color(color, square):
-          break
-
-        moves |= (1 << square)
-
-        # blocked by enemy piece, can't move any further in this direction
-        if self.is_occupied_by_color(not color, square):
-          break
-
-    return self.bit_scan(moves)
+    return self.get_sliding_attacks(self.mailbox[position], position) & ~self.pieces_by_color[color]
 
   @Profiler.profile_function
   def generate_pawn_moves(self, color, position):
@@ -189,7 +554,7 @@ class Board:
     # if white, moving up
     if color == 0:
       if 0 <= position <= 7:  # should never be possible, pawn would have been promoted
-        return []
+        return 0
 
       row_range = 2 if 48 <= position <= 55 else 1
       for i in range(row_range):
@@ -200,17 +565,9 @@ class Board:
 
         pawn_moves |= (1 << square)  # Set bit for each upward square
 
-      # capture diagonally
-      top_left_square, top_right_square = position - 9, position - 7
-      if top_left_square % 8 != 7 and self.is_occupied_by_color(not color, top_left_square):
-        pawn_moves |= (1 << top_left_square)
-
-      if top_right_square % 8 != 0 and self.is_occupied_by_color(not color, top_right_square):
-        pawn_moves |= (1 << top_right_square)
-
     if color == 1:
       if 56 <= position <= 63:  # should never be possible, pawn would have been promoted
-        return []
+        return 0
 
       row_range = 2 if 8 <= position <= 15 else 1
       for i in range(row_range):
@@ -221,12 +578,8 @@ class Board:
 
         pawn_moves |= (1 << square)
 
-      bottom_left_square, bottom_right_square = position + 7, position + 9
-      if bottom_left_square % 8 != 7 and self.is_occupied_by_color(not color, bottom_left_square):
-        pawn_moves |= (1 << bottom_left_square)
-
-      if bottom_right_square % 8 != 0 and self.is_occupied_by_color(not color, bottom_right_square):
-        pawn_moves |= (1 << bottom_right_square)
+    # capture diagonally
+    pawn_moves |= PAWN_ATTACKS[color][position] & self.pieces_by_color[1 - color]
 
     # en passant
     if self.en_passant_square:
@@ -240,57 +593,28 @@ class Board:
           if color == 1:
             pawn_moves |= (1 << (self.en_passant_square + 8))
 
-    return self.bit_scan(pawn_moves)
+    return pawn_moves
 
   @Profiler.profile_function
   def generate_knight_moves(self, color, position):
-    knight_offsets = [-17, -15, -10, -6, 6, 10, 15, 17]
-    knight_moves = 0
-
-    row, col = position // 8, position % 8
-
-    for offset in knight_offsets:
-      target_pos = position + offset
-      target_row, target_col = target_pos // 8, target_pos % 8
-
-      if abs(target_row - row) > 2 or abs(target_col - col) > 2:
-        continue
-
-      if not 0 <= target_pos < 64:
-        continue
-
-      if not self.is_occupied_by_color(color, target_pos):
-        knight_moves |= (1 << target_pos)
-
-    return self.bit_scan(knight_moves)
+    return KNIGHT_ATTACKS[position] & ~self.pieces_by_color[color]
 
   @Profiler.profile_function
   def generate_king_moves(self, color, position):
-    king_moves = 0
-
-    for direction in range(8):
-      for i in range(min(1, self.num_squares_to_edge[position][direction])):
-        square = position + direction_offsets[direction] * (i + 1)
-
-        if self.is_occupied_by_color(color, square):
-          continue
-
-        king_moves |= (1 << square)
-
-    # check left rook and right rook to see if we can castle
-    if position in self.king_castling_squares and not self.is_attacked(color, position):
-      for direction in range(2, 4):
-        for i in range(self.num_squares_to_edge[position][direction]):
-          square = position + direction_offsets[direction] * (i + 1)
-
-          if self.is_occupied(square) and square not in self.rook_castling_squares:
-            break
-
-          # the opponent attacks a square that the castling path needs to go over
-          if self.is_attacked(color, square) and abs(position - square) <= 2:
-            break
-
-          if self.is_occupied_by_color(color, square) and square in self.rook_castling_squares:
-            king_moves |= (1 << square)
-
-    return self.bit_scan(king_moves)
+    king_moves = KING_ATTACKS[position] & ~self.pieces_by_color[color]
+
+    # castling is encoded as the king moving onto its own rook
+    if self.castling_rights:
+      rook = self.bitboard[2 if color == 0 else 8]
+      enemy_attacks = self.attacking_squares[1 - color]
+      for right, king_square, rook_square, empty_squares, safe_squares in CASTLING_PATHS[color]:
+        if (
+          self.castling_rights & right
+          and position == king_square
+          and (rook >> rook_square) & 1
+          and not self.all_pieces & empty_squares
+          and not enemy_attacks & (safe_squares | (1 << king_square))
+        ):
+          king_moves |= 1 << rook_square
+
+    return king_moves
@@ -0,0 +1,42 @@
+import struct
+
+from game.moves import NO_SQUARE
+
+
+# 12 bitboards, side to move, en passant square, castling rights, halfmove clock, fullmove number
+PACKED_STATE = struct.Struct('<12QBBBHH')
+
+
+class BoardState:
+  """Everything needed to put a Board and Game back exactly as they were.
+
+  Copy-make saves one of these per ply and restores it instead of undoing the move piece by
+  piece. The packed form (to_bytes) drops what can be recomputed and is what gets sent to
+  worker processes.
+  """
+  __slots__ = (
+    'bitboard', 'mailbox', 'all_pieces', 'pieces_by_color', 'attacks_from', 'attacking_squares',
+    'white_king_pos', 'black_king_pos', 'castling_rights',
+    'en_passant_square', 'zobrist_key', 'material_score', 'positional_score',
+    'color', 'halfmove_clock', 'fullmove_number', 'ply',
+  )
+
+  def to_bytes(self):
+    return PACKED_STATE.pack(
+      *self.bitboard,
+      self.color,
+      NO_SQUARE if self.en_passant_square == None else self.en_passant_square,
+      self.castling_rights,
+      min(self.halfmove_clock, 0xFFFF),
+      min(self.fullmove_number, 0xFFFF),
+    )
+
+  @staticmethod
+  def unpack(data):
+    """Unpack to_bytes() output into (bitboards, color, en passant square, castling rights, halfmove clock, fullmove number)."""
+    fields = PACKED_STATE.unpack(data)
+    color, en_passant_square, castling_rights, halfmove_clock, fullmove_number = fields[12:]
+    return (
+      fields[:12], color, None if en_passant_square == NO_SQUARE else en_passant_square,
+      castling_rights, halfmove_clock, fullmove_number
+    )
@@ -0,0 +1,61 @@
+def split_epd(line):
+  """Split an EPD line into its four position fields (as a FEN prefix) and the operations text."""
+  fields = line.split(None, 4)
+  if len(fields) < 4:
+    raise ValueError(f"Invalid EPD, expected at least four fields: {line!r}")
+  return (' '.join(fields[:4]), fields[4] if len(fields) > 4 else '')
+
+
+def parse_epd_operations(text):
+  """Parse EPD operations ('bm Nf3 e4; id "WAC.001";') into {opcode: [operands]}.
+
+  Quoted operands may contain spaces and semicolons; the quotes themselves are dropped.
+  """
+  operations = {}
+  tokens = []
+  index = 0
+  length = len(text)
+
+  while index < length:
+    char = text[index]
+    if char == ';':
+      if tokens:
+        operations[tokens[0]] = tokens[1:]
+        tokens = []
+      index += 1
+    elif char == '"':
+      end = text.find('"', index + 1)
+      end = length if end == -1 else end
+      tokens.append(text[index + 1:end])
+      index = end + 1
+    elif char.isspace():
+      index += 1
+    else:
+      end = index
+      while end < length and not text[end].isspace() and text[end] not in ';"':
+        end += 1
+      tokens.append(text[index:end])
+      index = end
+
+  if tokens:
+    operations[tokens[0]] = tokens[1:]
+
+  return operations
+
+
+def format_epd_operations(operations):
+  """Write {opcode: [operands]} back out as EPD operations, quoting operands that need it."""
+  formatted = []
+  for opcode, operands in operations.items():
+    if isinstance(operands, (str, int, float)):
+      operands = [operands]
+
+    parts = [opcode]
+    for operand in operands:
+      operand = str(operand)
+      if not operand or any(char.isspace() or char in ';"' for char in operand):
+        operand = f'"{operand}"'
+      parts.append(operand)
+    formatted.append(' '.join(parts) + ';')
+
+  return ' '.join(formatted)
@@ -1,221 +1,607 @@
-from game.bitboard import Board
+from array import array
+
+from game.bitboard import Board, ALL_SQUARES
+from game.board_state import BoardState
+from game.moves import (
+  FLAG_CAPTURE, FLAG_EN_PASSANT, FLAG_CASTLE, FLAG_DOUBLE_PUSH, PROMOTION_PIECES, NO_SQUARE,
+  CASTLING_RIGHTS_MASK, new_move_buffer, encode_undo_record, get_promotion
+)
+from game.epd import split_epd, parse_epd_operations, format_epd_operations
+from game.zobrist import ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_EN_PASSANT, ZOBRIST_CASTLING
 from constants.fen import STARTING_BOARD, KIWIPETE, POSITION3
+from constants.pieces import EMPTY_SQUARE, MATERIAL_SCORES, POSITIONAL_SCORES, PIECE_NAMES, SQUARES_MAP
 from game.profiler import Profiler
 
 
+# plies of history preallocated up front, doubled if a game ever runs longer
+HISTORY_CAPACITY = 1024
+
+# most moves a single piece can have: a queen in the middle of an open board
+MAX_PIECE_MOVES = 27
+
+
 class Game:
+  __slots__ = (
+    'board', 'current_player_color', 'halfmove_clock', 'fullmove_number', 'ply',
+    'undo_records', 'undo_zobrist_keys', 'undo_attacking_squares', 'undo_scores', 'undo_attacks_from',
+    'move_buffers', 'copy_make', 'saved_states', 'verify_zobrist',
+  )
+
   def __init__(self):
     self.board = Board()
-    self.board.setup_starting_pieces_from_fen(STARTING_BOARD)
-
-    self.current_player_color = 0
-
-    # used for undo functionality
-    self.last_moves = []
+    self.current_player_color, self.halfmove_clock, self.fullmove_number = self.board.setup_starting_pieces_from_fen(STARTING_BOARD)
+
+    # used for undo functionality: one packed record per ply, plus the state that doesn't fit in it
+    self.ply = 0
+    self.undo_records = array('Q', bytes(8 * HISTORY_CAPACITY))
+    self.undo_zobrist_keys = array('Q', bytes(8 * HISTORY_CAPACITY))
+    self.undo_attacking_squares = array('Q', bytes(16 * HISTORY_CAPACITY))
+    self.undo_scores = array('i', bytes(8 * HISTORY_CAPACITY))
+    self.undo_attacks_from = [[0] * 64 for _ in range(HISTORY_CAPACITY)]
+
+    # reusable move lists, one per ply so a search never overwrites the moves of the node above it
+    self.move_buffers = [new_move_buffer() for _ in range(HISTORY_CAPACITY)]
+
+    # copy-make mode: make_move saves a whole BoardState per ply and undo_move restores it,
+    # instead of the undo arrays above
+    self.copy_make = False
+    self.saved_states = [None] * HISTORY_CAPACITY
+
+    # debug mode: check the incrementally updated position hash against a full recompute after every move
+    self.verify_zobrist = False
+
+  def grow_history(self):
+    capacity = len(self.move_buffers)
+    self.undo_records.frombytes(bytes(8 * capacity))
+    self.undo_zobrist_keys.frombytes(bytes(8 * capacity))
+    self.undo_attacking_squares.frombytes(bytes(16 * capacity))
+    self.undo_scores.frombytes(bytes(8 * capacity))
+    self.undo_attacks_from.extend([0] * 64 for _ in range(capacity))
+    self.move_buffers.extend(new_move_buffer() for _ in range(capacity))
+    self.saved_states.extend([None] * capacity)
+
+  def save_state(self):
+    """Copy the whole game position into a BoardState."""
+    state = self.board.get_state()
+    state.color = self.current_player_color
+    state.halfmove_clock = self.halfmove_clock
+    state.fullmove_number = self.fullmove_number
+    state.ply = self.ply
+    return state
+
+  def restore_state(self, state):
+    """Go back to a state from save_state, taken earlier on this same game's move history."""
+    self.board.set_state(state)
+    self.current_player_color = state.color
+    self.halfmove_clock = state.halfmove_clock
+    self.fullmove_number = state.fullmove_number
+    self.ply = state.ply
+
+  def get_snapshot(self):
+    """Pack the position into a few bytes to send to a worker process, see BoardState.to_bytes."""
+    return self.save_state().to_bytes()
+
+  def load_snapshot(self, snapshot):
+    """Replace the current position with a snapshot, starting a fresh undo history."""
+    bitboards, color, en_passant_square, castling_rights, halfmove_clock, fullmove_number = BoardState.unpack(snapshot)
+    self.board.setup_from_bitboards(bitboards, en_passant_square, castling_rights, color)
+    self.current_player_color = color
+    self.halfmove_clock = halfmove_clock
+    self.fullmove_number = fullmove_number
+    self.ply = 0
+
+  def load_fen(self, fen):
+    """Replace the current position with a FEN position, starting a fresh undo history."""
+    self.current_player_color, self.halfmove_clock, self.fullmove_number = self.board.setup_starting_pieces_from_fen(fen)
+    self.ply = 0
+
+  def get_fen(self):
+    return self.board.to_fen(self.current_player_color, self.halfmove_clock, self.fullmove_number)
+
+  def load_epd(self, epd):
+    """Set up the position of an EPD line and return its operations, e.g. {'bm': ['Qg6'], 'id': ['WAC.003']}.
+
+    The hmvc and fmvn operations, when present, set the clocks.
+    """
+    position, operations_text = split_epd(epd)
+    operations = parse_epd_operations(operations_text)
+    self.load_fen(position)
+
+    if operations.get('hmvc'):
+      self.halfmove_clock = int(operations['hmvc'][0])
+    if operations.get('fmvn'):
+      self.fullmove_number = int(operations['fmvn'][0])
+
+    return operations
+
+  def get_epd(self, operations=None):
+    position = ' '.join(self.get_fen().split()[:4])
+    return f"{position} {format_epd_operations(operations)}" if operations else position
+
+  def move_to_san(self, move):
+    """Write a legal move of the side to move in standard algebraic notation (Nbd7, exd5, e8=Q+, O-O)."""
+    board = self.board
+    from_pos = move & 63
+    target_pos = (move >> 6) & 63
+    piece_type = board.mailbox[from_pos]
+
+    if move & FLAG_CASTLE:
+      san = 'O-O' if target_pos > from_pos else 'O-O-O'
+    else:
+      is_capture = move & (FLAG_CAPTURE | FLAG_EN_PASSANT)
+      target = SQUARES_MAP[target_pos]
+
+      if board.is_pawn(piece_type):
+        san = (SQUARES_MAP[from_pos][0] + 'x' if is_capture else '') + target
+        promotion = get_promotion(move)
+        if promotion:
+          san += '=' + PIECE_NAMES[promotion].upper()
+      else:
+        # name the origin file, rank or both if another piece of the same type can reach the square
+        rivals = [
+          other & 63 for other in self.get_legal_moves()
+          if (other >> 6) & 63 == target_pos and other & 63 != from_pos and board.mailbox[other & 63] == piece_type
+        ]
+        origin = SQUARES_MAP[from_pos]
+        if not rivals:
+          disambiguation = ''
+        elif all(rival % 8 != from_pos % 8 for rival in rivals):
+          disambiguation = origin[0]
+        elif all(rival // 8 != from_pos // 8 for rival in rivals):
+          disambiguation = origin[1]
+        else:
+          disambiguation = origin
+
+        san = PIECE_NAMES[piece_type].upper() + disambiguation + ('x' if is_capture else '') + target
+
+    self.make_move(move)
+    if self.king_in_check(self.current_player_color):
+      san += '#' if self.is_checkmate() else '+'
+    self.undo_move()
+
+    return san
 
   def king_in_check(self, color):
-    if color == 0:
-      return self.board.white_king_pos in self.board.black_attacking_squares
-
-    if color == 1:
-      return self.board.black_king_pos in self.board.white_attacking_squares
+    king_pos = self.board.white_king_pos if color == 0 else self.board.black_king_pos
+    return (self.board.attacking_squares[1 - color] >> king_pos) & 1
 
   def is_checkmate(self):
     if not self.king_in_check(self.current_player_color):
       return False
 
-    moves = []
-    for square in range(64):
-      piece_type = self.board.get_square_piece(square)
-      if piece_type == None:
-        continue
-
-      piece_color = 0 if piece_type < 6 else 1
-      if piece_color == self.current_player_color:
-        for target_pos in self.board.generate_moves(piece_type, square):
-          moves.append((square, target_pos))
+    return not self.has_legal_move()
 
-    for move in moves:
-      self.make_move(move)
-      if not self.king_in_check(1 - self.current_player_color):
-        self.undo_move()
-        return False
-      self.undo_move()
+  def is_stalemate(self):
+    if self.king_in_check(self.current_player_color):
+      return False
 
-    return True
+    return not self.has_legal_move()
 
   @Profiler.profile_function
+  def generate_moves(self, moves, legal=False, captures=None, legal_masks=None):
+    """Fill `moves` with the packed pseudo-legal moves of the side to move and return how many there are.
+
+    With legal=True (or the legal_masks of the position passed in) only the legal moves are kept,
+    filtering each piece's targets through the check and pin masks instead of playing the moves
+    out. captures=True keeps only captures, en passant included, and captures=False only the rest.
+    """
+    board = self.board
+    generate_piece_moves = board.generate_moves
+    add_piece_moves = self.add_piece_moves
+    if legal and legal_masks == None:
+      legal_masks = self.get_legal_masks()
+    count = 0
+
+    if captures != None:
+      capture_targets = board.pieces_by_color[1 - self.current_player_color]
+      en_passant_target = 0
+      if board.en_passant_square != None:
+        en_passant_target = 1 << (board.en_passant_square - 8 if self.current_player_color == 0 else board.en_passant_square + 8)
+
+    pieces = board.pieces_by_color[self.current_player_color]
+    while pieces:
+      from_pos = (pieces & -pieces).bit_length() - 1
+      pieces &= pieces - 1
+      piece_type = board.mailbox[from_pos]
+      targets = generate_piece_moves(piece_type, from_pos)
+      if legal_masks != None:
+        targets = self.filter_legal_targets(piece_type, from_pos, targets, legal_masks)
+      if captures != None:
+        # only a pawn reaches the en passant square diagonally, for anything else it is a quiet move
+        piece_captures = capture_targets | en_passant_target if piece_type == 5 or piece_type == 11 else capture_targets
+        targets &= piece_captures if captures else ~piece_captures
+      count = add_piece_moves(moves, count, piece_type, from_pos, targets)
+
+    return count
+
+  def iter_legal_moves(self):
+    """Yield the legal moves of the side to move one piece at a time, king first.
+
+    For callers that only need to know whether there is a legal move: the pieces after the
+    first one with a move are never looked at.
+    """
+    board = self.board
+    legal_masks = self.get_legal_masks()
+    king_pos = legal_masks[3]
+    piece_moves = [0] * MAX_PIECE_MOVES
+
+    # in check the king is the piece most likely to have a way out
+    from_pos = king_pos
+    pieces = board.pieces_by_color[self.current_player_color] & ~(1 << king_pos)
+    while True:
+      piece_type = board.mailbox[from_pos]
+      targets = self.filter_legal_targets(piece_type, from_pos, board.generate_moves(piece_type, from_pos), legal_masks)
+      for index in range(self.add_piece_moves(piece_moves, 0, piece_type, from_pos, targets)):
+        yield piece_moves[index]
+
+      if not pieces:
+        return
+      from_pos = (pieces & -pieces).bit_length() - 1
+      pieces &= pieces - 1
+
+  def has_legal_move(self):
+    return next(self.iter_legal_moves(), None) != None
+
+  def get_legal_masks(self):
+    """Board.get_legal_move_masks for the side to move, plus its king square and en passant target."""
+    board = self.board
+    color = self.current_player_color
+    check_mask, pin_rays, king_danger = board.get_legal_move_masks(color)
+    king_pos = board.white_king_pos if color == 0 else board.black_king_pos
+
+    en_passant_target = NO_SQUARE
+    if board.en_passant_square != None:
+      en_passant_target = board.en_passant_square - 8 if color == 0 else board.en_passant_square + 8
+
+    return (check_mask, pin_rays, king_danger, king_pos, en_passant_target)
+
+  def filter_legal_targets(self, piece_type, from_pos, targets, legal_masks):
+    """Drop the pseudo-legal targets of a piece that would leave its own king in check."""
+    check_mask, pin_rays, king_danger, king_pos, en_passant_target = legal_masks
+    board = self.board
+
+    if from_pos == king_pos:
+      # castling (onto an own rook) was already checked against attacks by generate_king_moves
+      return (targets & board.pieces_by_color[self.current_player_color]) | (targets & ~king_danger)
+
+    en_passant = (targets >> en_passant_target) & 1 if en_passant_target != NO_SQUARE else 0
+    targets &= check_mask & pin_rays.get(from_pos, ALL_SQUARES)
+    if en_passant and (piece_type == 5 or piece_type == 11):
+      if board.is_en_passant_legal(self.current_player_color, from_pos):
+        targets |= 1 << en_passant_target
+      else:
+        targets &= ~(1 << en_passant_target)
+
+    return targets
+
+  def add_piece_moves(self, moves, count, piece_type, from_pos, targets):
+    """Write the packed moves of one piece to its target squares into `moves` from index count on."""
+    board = self.board
+    color = self.current_player_color
+    enemy_pieces = board.pieces_by_color[1 - color]
+
+    if piece_type == 5 or piece_type == 11:
+      while targets:
+        target_pos = (targets & -targets).bit_length() - 1
+        targets &= targets - 1
+
+        if (enemy_pieces >> target_pos) & 1:
+          flags = FLAG_CAPTURE
+        elif (target_pos - from_pos) % 8:  # diagonal step onto an empty square
+          flags = FLAG_EN_PASSANT
+        elif abs(target_pos - from_pos) == 16:
+          flags = FLAG_DOUBLE_PUSH
+        else:
+          flags = 0
+
+        move = from_pos | (target_pos << 6) | flags
+        if target_pos < 8 or target_pos >= 56:
+          for promotion in PROMOTION_PIECES[color]:
+            moves[count] = move | (promotion << 12)
+            count += 1
+        else:
+          moves[count] = move
+          count += 1
+      return count
+
+    own_pieces = board.pieces_by_color[color]
+    while targets:
+      target_pos = (targets & -targets).bit_length() - 1
+      targets &= targets - 1
+
+      if (enemy_pieces >> target_pos) & 1:
+        moves[count] = from_pos | (target_pos << 6) | FLAG_CAPTURE
+      elif (own_pieces >> target_pos) & 1:  # only a castling king targets its own piece
+        moves[count] = from_pos | (target_pos << 6) | FLAG_CASTLE
+      else:
+        moves[count] = from_pos | (target_pos << 6)
+      count += 1
+
+    return count
+
   def get_all_moves(self):
-    moves = []
-    for square in range(64):
-      piece_type = self.board.get_square_piece(square)
-      if piece_type == None:
-        continue
+    """Get the pseudo-legal moves of the side to move as an array of packed moves."""
+    moves = self.move_buffers[self.ply]
+    return moves[:self.generate_moves(moves)]
+
+  def generate_legal_moves(self, moves):
+    """Fill `moves` with the packed legal moves of the side to move and return how many there are."""
+    return self.generate_moves(moves, legal=True)
+
+  def get_legal_moves(self, captures=None):
+    """Get the legal moves of the side to move as an array of packed moves, optionally only (non-)captures."""
+    moves = self.move_buffers[self.ply]
+    return moves[:self.generate_moves(moves, legal=True, captures=captures)]
+
+  def is_legal_move(self, move, legal_masks=None):
+    """Check a move from elsewhere (the hash table, a killer slot) against the current position."""
+    board = self.board
+    from_pos = move & 63
+    target_pos = (move >> 6) & 63
+    piece_type = board.mailbox[from_pos]
+    if piece_type == EMPTY_SQUARE or (piece_type < 6) != (self.current_player_color == 0):
+      return False
 
-      piece_color = 0 if piece_type < 6 else 1
-      if piece_color == self.current_player_color:
-        for target_pos in self.board.generate_moves(piece_type, square):
-          moves.append((square, target_pos))
+    if legal_masks == None:
+      legal_masks = self.get_legal_masks()
+    targets = self.filter_legal_targets(piece_type, from_pos, board.generate_moves(piece_type, from_pos), legal_masks)
+    if not (targets >> target_pos) & 1:
+      return False
 
-    return moves
+    # the flags and promotion have to match too, so compare with the packed moves to that square
+    piece_moves = [0] * MAX_PIECE_MOVES
+    count = self.add_piece_moves(piece_moves, 0, piece_type, from_pos, 1 << target_pos)
+    return move in piece_moves[:count]
 
-  def get_legal_moves(self):
-    moves = self.get_all_moves()
+  def find_move(self, from_pos, target_pos, promotion=None):
+    """Find the legal move between two squares, promoting to a queen unless told otherwise."""
+    for move in self.get_legal_moves():
+      if move & 63 != from_pos or (move >> 6) & 63 != target_pos:
+        continue
 
-    legal_moves = []
-    for move in moves:
-      self.make_move(move)
-      if not self.king_in_check(1 - self.current_player_color):
-        legal_moves.append(move)
-      self.undo_move()
+      move_promotion = get_promotion(move)
+      if promotion == None and move_promotion in (0, PROMOTION_PIECES[0][0], PROMOTION_PIECES[1][0]):
+        return move
+      if promotion == move_promotion:
+        return move
 
-    return legal_moves
+    return None
 
   @Profiler.profile_function
   def make_move(self, move):
-    from_pos, target_pos = move
-    piece_type = self.board.get_square_piece(from_pos)
+    board = self.board
+    from_pos = move & 63
+    target_pos = (move >> 6) & 63
+    piece_type = board.mailbox[from_pos]
     piece_color = 0 if piece_type < 6 else 1
     move_type = "standard"
-
-    self.last_moves.append({
-      'piece_type': piece_type,
-      'from_pos': from_pos,
-      'target_pos': target_pos,
-      'en_passant_square': self.board.en_passant_square,
-    })
-
-    # pawn stuff
-    dir = -8 if piece_color == 0 else 8
-    if self.board.is_pawn(piece_type) and abs(target_pos - dir) == self.board.en_passant_square:
-      enemy_pawn = self.board.get_square_piece(self.board.en_passant_square)
-      self.last_moves[-1]['target_piece_type'] = enemy_pawn
-      self.board.clear_bit(enemy_pawn, self.board.en_passant_square)  # perform en passant
+    all_pieces = board.all_pieces
+    previous_en_passant_square = board.en_passant_square
+    captured_piece = EMPTY_SQUARE
+    castling_rights = board.castling_rights
+
+    if self.ply + 1 >= len(self.move_buffers):
+      self.grow_history()
+
+    # the hash, scores and attack maps don't fit in the packed undo record, they are saved next to it
+    ply = self.ply
+    if self.copy_make:
+      self.saved_states[ply] = self.save_state()
+    else:
+      self.undo_zobrist_keys[ply] = board.zobrist_key
+      self.undo_scores[2 * ply] = board.material_score
+      self.undo_scores[2 * ply + 1] = board.positional_score
+      self.undo_attacking_squares[2 * ply] = board.attacking_squares[0]
+      self.undo_attacking_squares[2 * ply + 1] = board.attacking_squares[1]
+      self.undo_attacks_from[ply][:] = board.attacks_from
+
+    if move & FLAG_EN_PASSANT:
+      captured_piece = board.mailbox[previous_en_passant_square]
+      board.clear_bit(captured_piece, previous_en_passant_square)  # perform en passant
+      board.zobrist_key ^= ZOBRIST_PIECES[captured_piece][previous_en_passant_square]
+      board.material_score -= MATERIAL_SCORES[captured_piece]
+      board.positional_score -= POSITIONAL_SCORES[captured_piece][previous_en_passant_square]
       move_type = "en-passant"
 
-    if self.board.is_pawn(piece_type) and abs(target_pos - from_pos) == 16:
-      self.board.en_passant_square = target_pos
+    if previous_en_passant_square != None:
+      board.zobrist_key ^= ZOBRIST_EN_PASSANT[previous_en_passant_square]
+
+    if move & FLAG_DOUBLE_PUSH:
+      board.en_passant_square = target_pos
+      board.zobrist_key ^= ZOBRIST_EN_PASSANT[target_pos]
     else:
-      self.board.en_passant_square = None
+      board.en_passant_square = None
 
-    if self.board.is_king(piece_type):
+    if board.is_king(piece_type):
       if piece_color == 0:
-        self.board.white_king_pos = target_pos
+        board.white_king_pos = target_pos
       if piece_color == 1:
-        self.board.black_king_pos = target_pos
-
-      if from_pos in self.board.king_castling_squares:
-        self.last_moves[-1]['king_castling_square'] = from_pos
-        self.board.king_castling_squares.discard(from_pos)
+        board.black_king_pos = target_pos
 
-      if target_pos in self.board.rook_castling_squares:
+      if move & FLAG_CASTLE:
         self.castle(piece_type, piece_color, from_pos, target_pos)
         move_type = "castle"
 
-    if self.board.is_rook(piece_type) and from_pos in self.board.rook_castling_squares:
-      self.last_moves[-1]['rook_castling_square'] = from_pos
-      self.board.rook_castling_squares.discard(from_pos)
-
-    target_piece = self.board.get_square_piece(target_pos)
-    if target_piece:
-      self.last_moves[-1]['target_piece_type'] = target_piece
-      self.board.clear_bit(target_piece, target_pos)
-      move_type = "capture"
+    # moving the king or a rook, or capturing a rook on its starting square, loses those rights
+    if castling_rights:
+      new_castling_rights = castling_rights & CASTLING_RIGHTS_MASK[from_pos] & CASTLING_RIGHTS_MASK[target_pos]
+      if new_castling_rights != castling_rights:
+        board.castling_rights = new_castling_rights
+        board.zobrist_key ^= ZOBRIST_CASTLING[castling_rights] ^ ZOBRIST_CASTLING[new_castling_rights]
 
     if move_type != "castle":
-      self.board.clear_bit(piece_type, from_pos)
-      self.board.set_bit(piece_type, target_pos)
+      target_piece = board.mailbox[target_pos]
+      if target_piece != EMPTY_SQUARE:
+        captured_piece = target_piece
+        board.clear_bit(target_piece, target_pos)
+        board.zobrist_key ^= ZOBRIST_PIECES[target_piece][target_pos]
+        board.material_score -= MATERIAL_SCORES[target_piece]
+        board.positional_score -= POSITIONAL_SCORES[target_piece][target_pos]
+        move_type = "capture"
+
+      promotion = (move >> 12) & 15
+      placed_piece = promotion if promotion else piece_type
+      if promotion and move_type == "standard":
+        move_type = "promotion"
+
+      board.clear_bit(piece_type, from_pos)
+      board.set_bit(placed_piece, target_pos)
+      board.zobrist_key ^= ZOBRIST_PIECES[piece_type][from_pos] ^ ZOBRIST_PIECES[placed_piece][target_pos]
+      board.material_score += MATERIAL_SCORES[placed_piece] - MATERIAL_SCORES[piece_type]
+      board.positional_score += POSITIONAL_SCORES[placed_piece][target_pos] - POSITIONAL_SCORES[piece_type][from_pos]
+
+    self.undo_records[ply] = encode_undo_record(
+      move,
+      piece_type,
+      captured_piece,
+      NO_SQUARE if previous_en_passant_square == None else previous_en_passant_square,
+      castling_rights,
+      self.halfmove_clock
+    )
+    self.ply += 1
+
+    if captured_piece != EMPTY_SQUARE or board.is_pawn(piece_type):
+      self.halfmove_clock = 0
+    else:
+      self.halfmove_clock += 1
+    if piece_color == 1:
+      self.fullmove_number += 1
 
-    self.board.all_pieces = sum(self.board.bitboard)
-    self.board.pieces_by_color = [sum(self.board.bitboard[:6]), sum(self.board.bitboard[6:])]
-    self.board.get_attacking_squares()
+    board.all_pieces = sum(board.bitboard)
+    board.pieces_by_color = [sum(board.bitboard[:6]), sum(board.bitboard[6:])]
+    board.update_attacking_squares((all_pieces ^ board.all_pieces) | (1 << target_pos))
+    board.zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
     self.current_player_color = 1 - self.current_player_color
 
+    if self.verify_zobrist:
+      self.check_zobrist_key()
+
     return move_type
 
   @Profiler.profile_function
   def undo_move(self):
-    if not self.last_moves:
+    if self.ply == 0:
       return
 
-    last_move = self.last_moves.pop()
-    self.board.en_passant_square = last_move['en_passant_square']
+    if self.copy_make:
+      state = self.saved_states[self.ply - 1]
+      self.saved_states[self.ply - 1] = None
+      self.restore_state(state)
+      return
 
-    piece_type = last_move['piece_type']
+    self.ply -= 1
+    ply = self.ply
+    board = self.board
+    record = self.undo_records[ply]
+
+    from_pos = record & 63
+    target_pos = (record >> 6) & 63
+    promotion = (record >> 12) & 15
+    piece_type = (record >> 20) & 15
+    captured_piece = (record >> 24) & 15
+    en_passant_square = (record >> 28) & 127
     piece_color = 0 if piece_type < 6 else 1
 
-    from_pos = last_move['from_pos']
-    target_pos = last_move['target_pos']
-    target_piece_type = last_move.get('target_piece_type')
-    castling_squares = last_move.get('castling_squares')
-    removed_rook_castling_square = last_move.get('rook_castling_square')
-    removed_king_castling_square = last_move.get('king_castling_square')
+    self.halfmove_clock = (record >> 41) & 255
+    if piece_color == 1:
+      self.fullmove_number -= 1
+
+    board.en_passant_square = None if en_passant_square == NO_SQUARE else en_passant_square
 
-    if removed_rook_castling_square != None:
-      self.board.rook_castling_squares.add(removed_rook_castling_square)
+    board.castling_rights = (record >> 35) & 15
 
-    if removed_king_castling_square:
-      self.board.king_castling_squares.add(removed_king_castling_square)
+    if record & FLAG_CASTLE:
+      if target_pos - from_pos == 3:  # short-side castle
+        new_king_pos, new_rook_pos = target_pos - 1, target_pos - 2
+      else:
+        new_king_pos, new_rook_pos = target_pos + 2, target_pos + 3
 
-    dir = -8 if piece_color == 0 else 8
-    if self.board.is_pawn(piece_type) and abs(target_pos - dir) == self.board.en_passant_square:
-      self.board.set_bit(target_piece_type, self.board.en_passant_square)
+      rook_piece = board.mailbox[new_rook_pos]
+      board.clear_bit(piece_type, new_king_pos)
+      board.clear_bit(rook_piece, new_rook_pos)
+      board.set_bit(piece_type, from_pos)
+      board.set_bit(rook_piece, target_pos)
     else:
-      self.board.set_bit(target_piece_type, target_pos)
+      board.clear_bit(promotion if promotion else piece_type, target_pos)
+      board.set_bit(piece_type, from_pos)
 
-    if castling_squares:
-      self.board.rook_castling_squares.add(target_pos)
-      self.board.king_castling_squares.add(from_pos)
+      if captured_piece != EMPTY_SQUARE:
+        board.set_bit(captured_piece, en_passant_square if record & FLAG_EN_PASSANT else target_pos)
 
-      self.board.clear_bit(piece_type, castling_squares[1])
-      self.board.clear_bit(target_piece_type, castling_squares[0])
+    if board.is_king(piece_type):
+      if piece_color == 0:
+        board.white_king_pos = from_pos
+      if piece_color == 1:
+        board.black_king_pos = from_pos
+
+    board.all_pieces = sum(board.bitboard)
+    board.pieces_by_color = [sum(board.bitboard[:6]), sum(board.bitboard[6:])]
+    board.attacks_from[:] = self.undo_attacks_from[ply]
+    board.attacking_squares[0] = self.undo_attacking_squares[2 * ply]
+    board.attacking_squares[1] = self.undo_attacking_squares[2 * ply + 1]
+    board.zobrist_key = self.undo_zobrist_keys[ply]
+    board.material_score = self.undo_scores[2 * ply]
+    board.positional_score = self.undo_scores[2 * ply + 1]
+    self.current_player_color = 1 - self.current_player_color
 
-      self.board.set_bit(piece_type, from_pos)
-      self.board.set_bit(target_piece_type, target_pos)
+    if self.verify_zobrist:
+      self.check_zobrist_key()
 
-    self.board.clear_bit(piece_type, target_pos)
-    self.board.set_bit(piece_type, from_pos)
+  def make_null_move(self):
+    """Pass the turn without moving a piece, used by null-move pruning."""
+    board = self.board
+    if self.ply + 1 >= len(self.move_buffers):
+      self.grow_history()
 
-    self.board.all_pieces = sum(self.board.bitboard)
-    self.board.pieces_by_color = [sum(self.board.bitboard[:6]), sum(self.board.bitboard[6:])]
-    self.board.get_attacking_squares()
-    self.current_player_color = 1 - self.current_player_color
+    # only the en passant square and hash change, the record just has to remember those
+    self.undo_zobrist_keys[self.ply] = board.zobrist_key
+    self.undo_records[self.ply] = NO_SQUARE if board.en_passant_square == None else board.en_passant_square
+    self.ply += 1
 
-  @Profiler.profile_function
-  def castle(self, piece_type, piece_color, from_pos, target_pos):
-    rook_piece = self.board.get_square_piece(target_pos)
-    new_king_pos = None
-    new_castling_squares = None
+    if board.en_passant_square != None:
+      board.zobrist_key ^= ZOBRIST_EN_PASSANT[board.en_passant_square]
+      board.en_passant_square = None
 
-    if target_pos - from_pos == 3:  # short-side castle
-      new_king_pos = target_pos - 1
-      new_castling_squares = [target_pos - 2, new_king_pos]
+    board.zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
+    self.current_player_color = 1 - self.current_player_color
 
-      self.board.clear_bit(rook_piece, target_pos)
-      self.board.set_bit(rook_piece, target_pos - 2)
+  def undo_null_move(self):
+    self.ply -= 1
+    en_passant_square = self.undo_records[self.ply]
 
-      self.board.clear_bit(piece_type, from_pos)
-      self.board.set_bit(piece_type, new_king_pos)
+    self.board.en_passant_square = None if en_passant_square == NO_SQUARE else en_passant_square
+    self.board.zobrist_key = self.undo_zobrist_keys[self.ply]
+    self.current_player_color = 1 - self.current_player_color
 
-    elif from_pos - target_pos == 4:  # long-side castle
-      new_king_pos = target_pos + 2
-      new_castling_squares = [target_pos + 3, new_king_pos]
+  def check_zobrist_key(self):
+    """Raise if the incrementally updated hash drifted from the hash of the current position."""
+    expected_key = self.board.compute_zobrist_key(self.current_player_color)
+    if self.board.zobrist_key != expected_key:
+      raise AssertionError(
+        f"Zobrist key mismatch at ply {self.ply}: "
+        f"incremental {self.board.zobrist_key:#018x}, recomputed {expected_key:#018x}"
+      )
 
-      self.board.clear_bit(rook_piece, target_pos)
-      self.board.set_bit(rook_piece, target_pos + 3)
+  @Profiler.profile_function
+  def castle(self, piece_type, piece_color, from_pos, target_pos):
+    board = self.board
+    rook_piece = board.mailbox[target_pos]
 
-      self.board.clear_bit(piece_type, from_pos)
-      self.board.set_bit(piece_type, new_king_pos)
+    if target_pos - from_pos == 3:  # short-side castle
+      new_king_pos, new_rook_pos = target_pos - 1, target_pos - 2
+    else:  # long-side castle
+      new_king_pos, new_rook_pos = target_pos + 2, target_pos + 3
+
+    board.clear_bit(rook_piece, target_pos)
+    board.set_bit(rook_piece, new_rook_pos)
+    board.clear_bit(piece_type, from_pos)
+    board.set_bit(piece_type, new_king_pos)
+    board.zobrist_key ^= ZOBRIST_PIECES[rook_piece][target_pos] ^ ZOBRIST_PIECES[rook_piece][new_rook_pos]
+    board.zobrist_key ^= ZOBRIST_PIECES[piece_type][from_pos] ^ ZOBRIST_PIECES[piece_type][new_king_pos]
+    board.positional_score += POSITIONAL_SCORES[rook_piece][new_rook_pos] - POSITIONAL_SCORES[rook_piece][target_pos]
+    board.positional_score += POSITIONAL_SCORES[piece_type][new_king_pos] - POSITIONAL_SCORES[piece_type][from_pos]
 
     if piece_color == 0:
-      self.board.white_king_pos = new_king_pos
+      board.white_king_pos = new_king_pos
     if piece_color == 1:
-      self.board.black_king_pos = new_king_pos
-
-    self.last_moves[-1]['target_piece_type'] = rook_piece
-    self.last_moves[-1]['castling_squares'] = new_castling_squares
-    self.board.king_castling_squares.discard(from_pos)
-    self.board.rook_castling_squares.discard(target_pos)
-    self.board.all_pieces = sum(self.board.bitboard)
-    self.board.pieces_by_color = [sum(self.board.bitboard[:6]), sum(self.board.bitboard[6:])]
-    self.board.get_attacking_squares()
+      board.black_king_pos = new_king_pos
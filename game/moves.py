@@ -0,0 +1,111 @@
+from array import array
+
+from constants.pieces import (
+  PIECE_WHITE_QUEEN, PIECE_WHITE_ROOK, PIECE_WHITE_BISHOP, PIECE_WHITE_KNIGHT,
+  PIECE_BLACK_QUEEN, PIECE_BLACK_ROOK, PIECE_BLACK_BISHOP, PIECE_BLACK_KNIGHT,
+  PIECE_NAMES, SQUARES_MAP
+)
+
+# Moves are packed into a single int:
+#   bits  0-5   from square
+#   bits  6-11  target square (for castling, the square of the rook the king moves onto)
+#   bits 12-15  promotion piece type, 0 if the move isn't a promotion (0 is the white king,
+#               which a pawn can never promote to)
+#   bits 16-19  flags
+FLAG_CAPTURE = 1 << 16
+FLAG_EN_PASSANT = 1 << 17
+FLAG_CASTLE = 1 << 18
+FLAG_DOUBLE_PUSH = 1 << 19
+
+# pieces a pawn can promote to, indexed by color
+PROMOTION_PIECES = (
+  (PIECE_WHITE_QUEEN, PIECE_WHITE_ROOK, PIECE_WHITE_BISHOP, PIECE_WHITE_KNIGHT),
+  (PIECE_BLACK_QUEEN, PIECE_BLACK_ROOK, PIECE_BLACK_BISHOP, PIECE_BLACK_KNIGHT),
+)
+
+# upper bound on the pseudo-legal moves of a single position
+MAX_MOVES = 256
+
+
+def get_from_square(move):
+  return move & 63
+
+
+def get_target_square(move):
+  return (move >> 6) & 63
+
+
+def get_promotion(move):
+  return (move >> 12) & 15
+
+
+def move_to_uci(move):
+  """Long algebraic notation (e2e4, e7e8q), castling written as the king's two-square step."""
+  from_pos = get_from_square(move)
+  target_pos = get_target_square(move)
+  if move & FLAG_CASTLE:
+    target_pos = from_pos + 2 if target_pos > from_pos else from_pos - 2
+
+  promotion = get_promotion(move)
+  suffix = PIECE_NAMES[promotion].lower() if promotion else ''
+  return SQUARES_MAP[from_pos] + SQUARES_MAP[target_pos] + suffix
+
+
+def new_move_buffer():
+  """Preallocated storage for the moves of one position."""
+  return array('I', bytes(4 * MAX_MOVES))
+
+
+# Undo records pack everything make_move destroys into one int:
+#   bits  0-19  the move itself
+#   bits 20-23  piece type that made the move
+#   bits 24-27  captured piece type, EMPTY_SQUARE if nothing was captured
+#   bits 28-34  previous en passant square, NO_SQUARE if there was none
+#   bits 35-38  castling rights before the move
+#   bits 41-48  halfmove clock before the move
+NO_SQUARE = 64
+
+# castling rights are kept as a 4-bit int, one bit per right
+CASTLE_WHITE_KINGSIDE = 1
+CASTLE_WHITE_QUEENSIDE = 2
+CASTLE_BLACK_KINGSIDE = 4
+CASTLE_BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = 15
+
+# FEN castling letters and the right each one stands for, in FEN order
+FEN_CASTLING_RIGHTS = {'K': CASTLE_WHITE_KINGSIDE, 'Q': CASTLE_WHITE_QUEENSIDE, 'k': CASTLE_BLACK_KINGSIDE, 'q': CASTLE_BLACK_QUEENSIDE}
+
+# per color, (right, king square, rook square, squares that must be empty, squares the king crosses
+# that must not be attacked) for each castle
+CASTLING_PATHS = (
+  (
+    (CASTLE_WHITE_KINGSIDE, 60, 63, (1 << 61) | (1 << 62), (1 << 61) | (1 << 62)),
+    (CASTLE_WHITE_QUEENSIDE, 60, 56, (1 << 57) | (1 << 58) | (1 << 59), (1 << 58) | (1 << 59)),
+  ),
+  (
+    (CASTLE_BLACK_KINGSIDE, 4, 7, (1 << 5) | (1 << 6), (1 << 5) | (1 << 6)),
+    (CASTLE_BLACK_QUEENSIDE, 4, 0, (1 << 1) | (1 << 2) | (1 << 3), (1 << 2) | (1 << 3)),
+  ),
+)
+
+# rights kept when a piece moves from or to each square: moving a king or rook, or capturing a
+# rook on its starting square, gives up the rights that depend on it
+CASTLING_RIGHTS_MASK = [ALL_CASTLING_RIGHTS] * 64
+for _color_paths in CASTLING_PATHS:
+  for _right, _king_square, _rook_square, _, _ in _color_paths:
+    CASTLING_RIGHTS_MASK[_king_square] &= ~_right
+    CASTLING_RIGHTS_MASK[_rook_square] &= ~_right
+
+# the halfmove clock saved in bits 41-48 of the undo record saturates here
+MAX_RECORDED_HALFMOVE_CLOCK = 255
+
+
+def encode_undo_record(move, piece_type, captured_piece, en_passant_square, castling_rights, halfmove_clock=0):
+  return (
+    (move & 0xFFFFF)
+    | (piece_type << 20)
+    | (captured_piece << 24)
+    | (en_passant_square << 28)
+    | (castling_rights << 35)
+    | (min(halfmove_clock, MAX_RECORDED_HALFMOVE_CLOCK) << 41)
+  )
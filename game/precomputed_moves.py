@@ -23,4 +23,8 @@ def PrecomputeMoveData():
         min(numSquaresSouth, numSquaresWest)
       ]
   
-  return num_squares_to_edge
\ No newline at end of file
+  return num_squares_to_edge
+
+
+# shared by every board, built once on import
+num_squares_to_edge = PrecomputeMoveData()
@@ -1,56 +1,288 @@
+import os
+import sys
+import json
 import time
+import threading
 from functools import wraps
 from collections import defaultdict
 
 
+# CHESS_PROFILE=trace times every call of the registered functions, CHESS_PROFILE=sample samples
+# the stacks of running threads instead; unset, profile_function leaves functions untouched
+PROFILE_ENV_VAR = 'CHESS_PROFILE'
+SAMPLE_INTERVAL_ENV_VAR = 'CHESS_PROFILE_INTERVAL'
+
+TRACE_MODE = 'trace'
+SAMPLE_MODE = 'sample'
+
+DEFAULT_SAMPLE_INTERVAL = 0.001  # seconds
+
+# trace events kept for export, the call tree keeps aggregating past this
+MAX_TRACE_EVENTS = 1000000
+
+
+class CallNode:
+  """One node of the call tree: a function called along a particular path of profiled callers."""
+
+  def __init__(self, name):
+    self.name = name
+    self.total_ns = 0
+    self.call_count = 0
+    self.children = {}
+
+  def child(self, name):
+    node = self.children.get(name)
+    if node is None:
+      node = self.children[name] = CallNode(name)
+    return node
+
+  def self_ns(self):
+    return self.total_ns - sum(child.total_ns for child in self.children.values())
+
+
 class Profiler():
+  """Opt-in profiler for the functions decorated with Profiler.profile_function.
+
+  Disabled (the default) the decorator returns the function itself, so there is no overhead at
+  all. Profiler.enable() turns it on at runtime by swapping wrappers onto the owning classes,
+  which only reaches code that looks the method up after the call: references cached earlier
+  keep calling the unwrapped function.
+  """
   _instance = None  # Singleton instance
 
+  mode = None
+  sample_interval = DEFAULT_SAMPLE_INTERVAL
+
+  # every decorated function, by qualified name, and the wrapper currently installed for it
+  registered = {}
+  wrappers = {}
+
   def __new__(cls):
     """Ensure a single instance is shared across all classes."""
     if cls._instance is None:
       cls._instance = super(Profiler, cls).__new__(cls)
+      cls._instance.local = threading.local()
+      cls._instance.sampler = None
       cls._instance.reset_profiler()
     return cls._instance
 
   @staticmethod
   def profile_function(func):
-    """Decorator to measure function execution time."""
+    """Register a function for profiling, wrapping it straight away if tracing is on."""
+    key = f"{func.__module__}.{func.__qualname__}"
+    Profiler.registered[key] = func
+
+    if Profiler.mode != TRACE_MODE:
+      return func
+
+    wrapper = Profiler.make_wrapper(func)
+    Profiler.wrappers[key] = wrapper
+    return wrapper
+
+  @staticmethod
+  def make_wrapper(func):
+    name = func.__qualname__
+    perf_counter_ns = time.perf_counter_ns
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-      profiler = Profiler()  # Get the shared instance
-      start_time = time.time()
-      result = func(*args, **kwargs)
-      elapsed_time = time.time() - start_time
-
-      if profiler.start_time is None:
-        profiler.start_time = start_time
+      profiler = Profiler._instance
+      stack = profiler.get_stack()
+      node = stack[-1].child(name)
+      stack.append(node)
 
-      profiler.profile_data[func.__name__]["total_time"] += elapsed_time
-      profiler.profile_data[func.__name__]["call_count"] += 1
+      start_ns = perf_counter_ns()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        elapsed_ns = perf_counter_ns() - start_ns
+        stack.pop()
+        node.total_ns += elapsed_ns
+        node.call_count += 1
 
-      return result
+        if len(profiler.trace_events) < MAX_TRACE_EVENTS:
+          profiler.trace_events.append((name, start_ns, elapsed_ns, threading.get_ident()))
 
     return wrapper
 
+  @staticmethod
+  def enable(mode=TRACE_MODE, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """Start profiling: trace every call of the registered functions, or sample thread stacks."""
+    Profiler.disable()
+    profiler = Profiler()
+    profiler.reset_profiler()
+    Profiler.mode = mode
+    Profiler.sample_interval = sample_interval
+
+    if mode == TRACE_MODE:
+      for key, func in Profiler.registered.items():
+        owner = Profiler.find_owner(func)
+        if owner is not None:
+          wrapper = Profiler.wrappers[key] = Profiler.make_wrapper(func)
+          setattr(owner, func.__name__, wrapper)
+    elif mode == SAMPLE_MODE:
+      profiler.start_sampler()
+    else:
+      raise ValueError(f"Unknown profiling mode: {mode}")
+
+  @staticmethod
+  def disable():
+    """Stop profiling and put the original functions back, keeping the data collected so far."""
+    profiler = Profiler()
+    if profiler.sampler:
+      profiler.sampler_stop.set()
+      profiler.sampler.join()
+      profiler.sampler = None
+
+    for key in list(Profiler.wrappers):
+      func = Profiler.registered[key]
+      owner = Profiler.find_owner(func)
+      if owner is not None and getattr(owner, func.__name__, None) is Profiler.wrappers[key]:
+        setattr(owner, func.__name__, func)
+      del Profiler.wrappers[key]
+
+    Profiler.mode = None
+
+  @staticmethod
+  def is_enabled():
+    return Profiler.mode != None
+
+  @staticmethod
+  def find_owner(func):
+    """The module or class a function was defined on, or None if it can't be reached by name."""
+    owner = sys.modules.get(func.__module__)
+    for part in func.__qualname__.split('.')[:-1]:
+      owner = getattr(owner, part, None)
+    return owner
+
+  def get_stack(self):
+    stack = getattr(self.local, 'stack', None)
+    if stack is None:
+      stack = self.local.stack = [self.call_tree]
+    return stack
+
+  def start_sampler(self):
+    self.sampler_stop = threading.Event()
+    self.sampler = threading.Thread(target=self.sample_stacks, daemon=True)
+    self.sampler.start()
+
+  def sample_stacks(self):
+    own_thread = threading.get_ident()
+    while not self.sampler_stop.wait(Profiler.sample_interval):
+      for thread_id, frame in sys._current_frames().items():
+        if thread_id == own_thread:
+          continue
+
+        stack = []
+        while frame is not None:
+          stack.append(frame.f_code.co_qualname if hasattr(frame.f_code, 'co_qualname') else frame.f_code.co_name)
+          frame = frame.f_back
+
+        self.samples[';'.join(reversed(stack))] += 1
+        self.sample_count += 1
+
+  def export_chrome_trace(self, path):
+    """Write the traced calls in Chrome's trace event format, viewable in chrome://tracing, Perfetto or speedscope."""
+    start_ns = self.trace_events[0][1] if self.trace_events else 0
+    events = [
+      {
+        'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': thread_id,
+        'ts': (call_start_ns - start_ns) / 1000, 'dur': elapsed_ns / 1000,
+      }
+      for name, call_start_ns, elapsed_ns, thread_id in self.trace_events
+    ]
+    with open(path, 'w') as file:
+      json.dump({'traceEvents': events, 'displayTimeUnit': 'ns'}, file)
+
+  def export_collapsed_stacks(self, path):
+    """Write the sampled stacks as collapsed stacks, the text format speedscope and flamegraph.pl read."""
+    with open(path, 'w') as file:
+      for stack, count in sorted(self.samples.items()):
+        file.write(f"{stack} {count}\n")
+
+  @staticmethod
   def print_profile_summary(moves_evaluated):
     profiler = Profiler()  # Get the singleton instance directly here
+    if not Profiler.is_enabled():
+      return
+
+    elapsed = time.perf_counter() - profiler.start_time
 
     print(f"\n{'-' * 10} Chess Engine Profiling Summary {'-' * 10}")
-    print(f"Total time to calculate move: {(time.time() - profiler.start_time):.2f}s.")
-    print(f"Moves evaluated per second: {int(moves_evaluated // (time.time() - profiler.start_time))}")
+    print(f"Total time profiled: {elapsed:.2f}s.")
+    print(f"Moves evaluated per second: {int(moves_evaluated // elapsed) if elapsed else 0}")
     print("-" * 56)
 
-    print("{:<25} {:<15} {:<15}".format("Function Name", "Call Count", "Total Time (s)"))
-    print("-" * 56)
+    if Profiler.mode == SAMPLE_MODE:
+      profiler.print_sample_summary()
+      return
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    profiler.collect_totals(profiler.call_tree, totals, set())
+
+    print("{:<40} {:<12} {:<12} {:<12}".format("Function Name", "Call Count", "Total (s)", "Self (s)"))
+    print("-" * 76)
+    for func_name, (call_count, total_ns, self_ns) in sorted(totals.items(), key=lambda x: x[1][1], reverse=True):
+      print("{:<40} {:<12} {:<12.3f} {:<12.3f}".format(func_name, call_count, total_ns / 1e9, self_ns / 1e9))
+
+    print("\nCall tree (recursive search calls nest once per ply):")
+    profiler.print_call_tree(profiler.call_tree, 0)
+
+  def collect_totals(self, node, totals, active):
+    """Flatten the call tree per function; time under a recursive call to the same function counts once."""
+    for child in node.children.values():
+      entry = totals[child.name]
+      entry[0] += child.call_count
+      entry[2] += child.self_ns()
+      if child.name not in active:
+        entry[1] += child.total_ns
 
-    for func_name, data in sorted(profiler.profile_data.items(), key=lambda x: x[1]["total_time"], reverse=True):
-      print("{:<25} {:<15} {:<15.3f}".format(func_name, data["call_count"], data["total_time"]))
+      active_child = child.name not in active
+      if active_child:
+        active.add(child.name)
+      self.collect_totals(child, totals, active)
+      if active_child:
+        active.discard(child.name)
+
+  def print_call_tree(self, node, depth, max_depth=12):
+    for child in sorted(node.children.values(), key=lambda child: child.total_ns, reverse=True):
+      print(f"{'  ' * depth}{child.name}: {child.call_count} calls, {child.total_ns / 1e9:.3f}s total, {child.self_ns() / 1e9:.3f}s self")
+      if depth + 1 < max_depth:
+        self.print_call_tree(child, depth + 1, max_depth)
+
+  def print_sample_summary(self, limit=25):
+    """Functions by the share of samples they were on the stack for (inclusive) and on top of it (self)."""
+    inclusive = defaultdict(int)
+    exclusive = defaultdict(int)
+    for stack, count in self.samples.items():
+      frames = stack.split(';')
+      exclusive[frames[-1]] += count
+      for func_name in set(frames):
+        inclusive[func_name] += count
+
+    total = max(self.sample_count, 1)
+    print(f"{self.sample_count} samples every {Profiler.sample_interval * 1000:.1f}ms")
+    print("{:<40} {:<12} {:<12}".format("Function Name", "Inclusive", "Self"))
+    print("-" * 64)
+    for func_name, count in sorted(inclusive.items(), key=lambda x: x[1], reverse=True)[:limit]:
+      print("{:<40} {:<12} {:<12}".format(func_name, f"{count / total * 100:.1f}%", f"{exclusive[func_name] / total * 100:.1f}%"))
 
   def reset_profiler(self):
-    self.start_time = None
+    self.start_time = time.perf_counter()
+    self.call_tree = CallNode('<root>')
+    self.local = threading.local()
+    self.trace_events = []
+    self.samples = defaultdict(int)
+    self.sample_count = 0
+
+
+def enable_from_environment():
+  mode = os.environ.get(PROFILE_ENV_VAR)
+  if not mode:
+    return
+
+  interval = float(os.environ.get(SAMPLE_INTERVAL_ENV_VAR, DEFAULT_SAMPLE_INTERVAL))
+  Profiler.enable(SAMPLE_MODE if mode == SAMPLE_MODE else TRACE_MODE, interval)
 
-    def default_profiling_data():
-      return {"total_time": 0, "call_count": 0}
 
-    self.profile_data = defaultdict(default_profiling_data)
+enable_from_environment()
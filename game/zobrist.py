@@ -0,0 +1,19 @@
+import random
+
+# Random 64-bit keys for Zobrist hashing. The generator is seeded so that keys (and therefore
+# position hashes) are identical across runs and across worker processes.
+_random = random.Random(0x5EED_C4E55)
+
+ZOBRIST_PIECES = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _random.getrandbits(64)
+
+# indexed by the square of the pawn that can be taken en passant
+ZOBRIST_EN_PASSANT = [_random.getrandbits(64) for _ in range(64)]
+
+# indexed by the 4-bit castling rights: the xor of one key per right held, so no rights hash to 0
+_castling_right_keys = [_random.getrandbits(64) for _ in range(4)]
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+  for _bit in range(4):
+    if _rights & (1 << _bit):
+      ZOBRIST_CASTLING[_rights] ^= _castling_right_keys[_bit]
@@ -1,147 +1,196 @@
+import sys
+import time
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 from game.game import Game
-from constants.fen import STARTING_BOARD, KIWIPETE, POSITION3
-from constants.pieces import SQUARES_MAP, PIECE_IMAGES
+from game.moves import move_to_uci
+from constants.fen import STARTING_BOARD, KIWIPETE, POSITION3, POSITION4, POSITION5
 
-from collections import defaultdict
 
-from PyQt6.QtWidgets import QApplication, QWidget, QGridLayout, QLabel
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QPixmap
-import sys
+# https://www.chessprogramming.org/Perft_Results
+PERFT_POSITIONS = {
+  'startpos': STARTING_BOARD,
+  'kiwipete': KIWIPETE,
+  'position3': POSITION3,
+  'position4': POSITION4,
+  'position5': POSITION5,
+}
+
+PERFT_RESULTS = {
+  STARTING_BOARD: (20, 400, 8902, 197281, 4865609, 119060324, 3195901860),
+  KIWIPETE: (48, 2039, 97862, 4085603, 193690690, 8031647685),
+  POSITION3: (14, 191, 2812, 43238, 674624, 11030083, 178633661),
+  POSITION4: (6, 264, 9467, 422333, 15833292, 706045033),
+  POSITION5: (44, 1486, 62379, 2103487, 89941194),
+}
 
+PERFT_CACHE_MB = 64
+PERFT_CACHE_ENTRY_BYTES = 17
 
-# change these for testing purposes as you need
-# https://www.chessprogramming.org/Perft_Results
-SEARCH_DEPTH = 3
-SEARCH_BOARD = STARTING_BOARD
-
-
-class GameWindow(QWidget):
-  def __init__(self):
-    super().__init__()
-    self.game = Game()
-    self.game.board.setup_starting_pieces_from_fen(SEARCH_BOARD)
-    self.labels = [None] * 64
-    self.moves_by_type = defaultdict(int)
-    self.moves_by_square = defaultdict(int)
-
-    self.move_index = 0
-    self.move_list = []
-    self.create_window()
-    self.display_pieces()
-
-    print(self.perft(SEARCH_DEPTH))
-    self.print_move_type_results()
-
-    self.timer = QTimer()
-    self.timer.timeout.connect(self.play_next_move)
-    self.timer.start(200)
-
-    self.selected_piece = None
-    self.selected_square = None
-    self.valid_moves = []
-
-  def create_window(self):
-    self.setWindowTitle('8x8 Chess Board')
-    self.setWindowFlags(self.windowFlags() | Qt.WindowType.WindowStaysOnTopHint)
-
-    grid = QGridLayout()
-    grid.setSpacing(0)
-    grid.setContentsMargins(0, 0, 0, 0)
-    self.setLayout(grid)
-    self.setGeometry(100, 100, 480, 480)
-
-    for row in range(8):
-      for col in range(8):
-        label = QLabel()
-        label.setFixedSize(60, 60)
-        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        if (row + col) % 2 == 0:
-          label.setStyleSheet("background-color: rgb(232, 235, 239);")
-        else:
-          label.setStyleSheet("background-color: rgb(125, 135, 150);")
-
-        self.labels[row * 8 + col] = label
-        grid.addWidget(label, row, col)
-
-  def perft(self, depth):
-    if depth == 0:
-      return 1
-
-    moves = self.game.get_legal_moves()
-    num_positions = 0
-
-    for move in moves:
-      try:
-        piece_type = self.game.board.get_square_piece(move[0])
-        if self.game.board.is_knight(piece_type):
-          self.moves_by_square["N" + SQUARES_MAP[move[1]]] += 1
-        if self.game.board.is_pawn(piece_type):
-          self.moves_by_square[SQUARES_MAP[move[1]]] += 1
-
-        self.move_list.append(move)
-        move_type = self.game.make_move(move)
-        self.moves_by_type[(depth, move_type)] += 1
-
-        if move_type == "en-passant":
-          self.moves_by_type[(depth, "capture")] += 1
-
-        if self.game.king_in_check(self.game.current_player_color):
-          self.moves_by_type[(depth, "checks")] += 1
-        
-        if self.game.is_checkmate():
-          self.moves_by_type[(depth, "checkmates")] += 1
-
-        num_positions += self.perft(depth - 1)
-
-        self.move_list.append("undo")
-        self.game.undo_move()
-      except Exception as e:
-        print(f"Error processing move: {move}")
-
-    return num_positions
-
-  def print_move_type_results(self):
-    results_by_depths = defaultdict(dict)
-    for depth, move_type in self.moves_by_type.keys():
-      if move_type == "standard":
-        continue
-
-      if move_type in results_by_depths[SEARCH_DEPTH - depth]:
-        results_by_depths[SEARCH_DEPTH - depth][move_type] += self.moves_by_type[(depth, move_type)]
-      else:
-        results_by_depths[SEARCH_DEPTH - depth][move_type] = self.moves_by_type[(depth, move_type)]
-
-    for depth, counts in results_by_depths.items():
-      if counts:
-        print(f"Depth: {depth + 1} --> {counts}")
-
-  def display_pieces(self):
-    for square in range(64):
-      piece_type = self.game.board.get_square_piece(square)
-      if piece_type != None:
-        pixmap = QPixmap(PIECE_IMAGES[piece_type])
-        pixmap = pixmap.scaled(60, 60, Qt.AspectRatioMode.KeepAspectRatio)
-        self.labels[square].setPixmap(pixmap)
-      else:
-        self.labels[square].clear()
-
-  def play_next_move(self):
-    if self.move_index < len(self.move_list):
-      move = self.move_list[self.move_index]
-      if move == "undo":
-        self.game.undo_move()
-      else:
-        self.game.make_move(move)
-
-      self.display_pieces()
-      self.move_index += 1
-    else:
-      self.timer.stop()  # Stop when all moves are played
-
-
-app = QApplication(sys.argv)
-ex = GameWindow()
-ex.show()
-sys.exit(app.exec())
+# mixed into the position key so the same position at different depths lands in different slots
+DEPTH_KEY_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+class PerftCache:
+  """Fixed-size always-replace table of subtree counts keyed by zobrist key and depth."""
+
+  def __init__(self, size_mb=PERFT_CACHE_MB):
+    num_entries = 1 << max(0, (size_mb * 1024 * 1024 // PERFT_CACHE_ENTRY_BYTES).bit_length() - 1)
+    self.mask = num_entries - 1
+    self.keys = array('Q', bytes(8 * num_entries))
+    self.counts = array('Q', bytes(8 * num_entries))
+    self.depths = array('b', bytes(num_entries))
+
+    self.hits = 0
+    self.misses = 0
+
+  def slot_key(self, key, depth):
+    return (key ^ (depth * DEPTH_KEY_MULTIPLIER)) & 0xFFFFFFFFFFFFFFFF
+
+  def probe(self, key, depth):
+    key = self.slot_key(key, depth)
+    index = key & self.mask
+    if self.keys[index] == key and self.depths[index] == depth:
+      self.hits += 1
+      return self.counts[index]
+
+    self.misses += 1
+    return None
+
+  def store(self, key, depth, count):
+    key = self.slot_key(key, depth)
+    index = key & self.mask
+    self.keys[index] = key
+    self.depths[index] = depth
+    self.counts[index] = count
+
+
+def perft(game, depth, cache=None):
+  """Count the leaf nodes of the legal move tree; the last ply is just the number of legal moves."""
+  key = game.board.zobrist_key
+  if cache:
+    num_positions = cache.probe(key, depth)
+    if num_positions != None:
+      return num_positions
+
+  moves = game.move_buffers[game.ply]
+  num_moves = game.generate_legal_moves(moves)
+
+  if depth == 1:
+    if cache:
+      cache.store(key, depth, num_moves)
+    return num_moves
+
+  # bound methods looked up once per node rather than once per move
+  make_move = game.make_move
+  undo_move = game.undo_move
+  num_positions = 0
+  for index in range(num_moves):
+    make_move(moves[index])
+    num_positions += perft(game, depth - 1, cache)
+    undo_move()
+
+  if cache:
+    cache.store(key, depth, num_positions)
+
+  return num_positions
+
+
+def divide(game, depth, cache=None):
+  """Leaf counts below each legal root move, as a list of (move, count)."""
+  results = []
+  for move in game.get_legal_moves():
+    game.make_move(move)
+    results.append((move, perft(game, depth - 1, cache) if depth > 1 else 1))
+    game.undo_move()
+
+  return results
+
+
+# per-process state for the worker pool, created once by the pool initializer
+_worker_game = None
+_worker_cache = None
+
+
+def init_worker(cache_mb):
+  global _worker_game, _worker_cache
+  _worker_game = Game()
+  _worker_cache = PerftCache(cache_mb) if cache_mb else None
+
+
+def perft_root_move(snapshot, move, depth):
+  _worker_game.load_snapshot(snapshot)
+  _worker_game.make_move(move)
+  return perft(_worker_game, depth - 1, _worker_cache) if depth > 1 else 1
+
+
+def parallel_divide(game, depth, workers, cache_mb=PERFT_CACHE_MB):
+  """divide() with the root moves' subtrees split across worker processes, each with its own cache."""
+  snapshot = game.get_snapshot()
+  moves = game.get_legal_moves()
+
+  with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_mb,)) as executor:
+    counts = executor.map(perft_root_move, [snapshot] * len(moves), moves, [depth] * len(moves))
+    return list(zip(moves, counts))
+
+
+def run_perft(fen, depth, workers=1, cache_mb=PERFT_CACHE_MB, show_divide=False):
+  game = Game()
+  game.load_fen(fen)
+
+  start_time = time.perf_counter()
+  if workers > 1:
+    results = parallel_divide(game, depth, workers, cache_mb)
+  else:
+    results = divide(game, depth, PerftCache(cache_mb) if cache_mb else None)
+  elapsed = time.perf_counter() - start_time
+
+  if show_divide:
+    for move, count in sorted(results, key=lambda result: move_to_uci(result[0])):
+      print(f"{move_to_uci(move)}: {count}")
+    print()
+
+  num_positions = sum(count for _, count in results)
+  expected = PERFT_RESULTS.get(fen)
+  if expected and depth <= len(expected):
+    status = "OK" if num_positions == expected[depth - 1] else f"MISMATCH (expected {expected[depth - 1]})"
+  else:
+    status = ""
+
+  print(f"Depth {depth}: {num_positions} nodes in {elapsed:.2f}s ({int(num_positions / max(elapsed, 1e-9))} nodes/s) {status}")
+  return num_positions == expected[depth - 1] if status else True
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Count the leaf nodes of the move tree to check move generation.")
+  parser.add_argument('position', nargs='?', default='startpos',
+                      help=f"one of {', '.join(PERFT_POSITIONS)}, or a FEN string (default: startpos)")
+  parser.add_argument('-d', '--depth', type=int, default=4)
+  parser.add_argument('-j', '--workers', type=int, default=1,
+                      help="split the root moves' subtrees across this many processes")
+  parser.add_argument('--hash', type=int, default=PERFT_CACHE_MB, dest='cache_mb',
+                      help="perft cache size in MB per process, 0 to disable")
+  parser.add_argument('--divide', action='store_true', help="print the count below each root move")
+  parser.add_argument('--all', action='store_true',
+                      help="run every depth from 1 up to --depth on every known position")
+  args = parser.parse_args(argv)
+
+  if args.all:
+    positions = list(PERFT_POSITIONS.items())
+  else:
+    positions = [(args.position, PERFT_POSITIONS.get(args.position, args.position))]
+
+  passed = True
+  for name, fen in positions:
+    print(name)
+    depths = range(1, args.depth + 1) if args.all else [args.depth]
+    for depth in depths:
+      passed &= run_perft(fen, depth, args.workers, args.cache_mb, args.divide)
+
+  return 0 if passed else 1
+
+
+if __name__ == '__main__':
+  sys.exit(main())
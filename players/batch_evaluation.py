@@ -0,0 +1,87 @@
+import random
+import time
+
+import numpy as np
+
+from game.game import Game
+from constants.pieces import MATERIAL_SCORES, POSITIONAL_SCORES
+from players.helper import evaluate_board
+
+
+# (12 * 64,) signed score of every piece type on every square, material included, laid out
+# to line up with the flattened bit planes of a position
+SQUARE_SCORES = np.array(
+  [MATERIAL_SCORES[piece_type] + POSITIONAL_SCORES[piece_type][square] for piece_type in range(12) for square in range(64)],
+  dtype=np.int64
+)
+
+# positions unpacked per chunk, bounds the (chunk, 768) byte array of bit planes
+CHUNK_SIZE = 1 << 16
+
+
+def bitboards_to_array(boards):
+  """Stack Board.bitboard lists (12 ints each) into an (N, 12) uint64 array."""
+  return np.array(boards, dtype=np.uint64).reshape(-1, 12)
+
+
+def unpack_bit_planes(bitboards):
+  """Turn an (N, 12) uint64 array into (N, 12, 64) 0/1 planes, plane[..., i] being square i."""
+  bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+  as_bytes = bitboards.view(np.uint8).reshape(len(bitboards), 12, 8)
+  return np.unpackbits(as_bytes, axis=-1, bitorder='little')
+
+
+def evaluate_boards(bitboards):
+  """Evaluate N positions at once, returning an int64 array equal to evaluate_board on each row.
+
+  Takes an (N, 12) uint64 array in the same layout as Board.bitboard.
+  """
+  bitboards = np.asarray(bitboards, dtype=np.uint64).reshape(-1, 12)
+  scores = np.empty(len(bitboards), dtype=np.int64)
+
+  for start in range(0, len(bitboards), CHUNK_SIZE):
+    planes = unpack_bit_planes(bitboards[start:start + CHUNK_SIZE])
+    scores[start:start + CHUNK_SIZE] = planes.reshape(len(planes), 12 * 64) @ SQUARE_SCORES
+
+  return scores
+
+
+def generate_random_positions(num_positions, max_plies=60, seed=0):
+  """Collect bitboards along random playouts from the starting position."""
+  rng = random.Random(seed)
+  positions = []
+  while len(positions) < num_positions:
+    game = Game()
+    for _ in range(rng.randint(1, max_plies)):
+      moves = game.get_legal_moves()
+      if not moves:
+        break
+      game.make_move(rng.choice(moves))
+      positions.append(list(game.board.bitboard))
+
+  return positions[:num_positions]
+
+
+def benchmark_batch_evaluation(num_positions=20000):
+  positions = generate_random_positions(num_positions)
+  bitboards = bitboards_to_array(positions)
+
+  start_time = time.perf_counter()
+  scalar_scores = [evaluate_board(board) for board in positions]
+  scalar_time = time.perf_counter() - start_time
+
+  start_time = time.perf_counter()
+  batch_scores = evaluate_boards(bitboards)
+  batch_time = time.perf_counter() - start_time
+
+  if batch_scores.tolist() != scalar_scores:
+    raise AssertionError("Batch evaluation does not match evaluate_board")
+
+  print(f"Positions:          {num_positions}")
+  print(f"evaluate_board:     {scalar_time:.3f}s ({int(num_positions / scalar_time)} positions/s)")
+  print(f"evaluate_boards:    {batch_time:.3f}s ({int(num_positions / batch_time)} positions/s)")
+  print(f"Speedup:            {scalar_time / batch_time:.1f}x")
+
+
+if __name__ == '__main__':
+  benchmark_batch_evaluation()
@@ -1,4 +1,4 @@
-from constants.pieces import PIECE_NAMES, PIECE_VALUES, PIECE_MAPPING, PIECE_SQUARE_TABLES
+from constants.pieces import PIECE_VALUES, PIECE_MAPPING, PIECE_SQUARE_TABLES
 
 
 def evaluate_board(board):
@@ -23,21 +23,6 @@ def evaluate_board(board):
   return score
 
 
-def order_moves_mvv_lva(moves, board):
-  def mvv_lva(move):
-    from_pos, target_pos = move
-    piece = board.get_square_piece(from_pos)
-    target = board.get_square_piece(target_pos)
-    
-    if piece != None and target != None:
-      piece_value = PIECE_VALUES[PIECE_NAMES[piece].upper()]
-      target_value = PIECE_VALUES[PIECE_NAMES[target].upper()]
-      return (10 * target_value) - piece_value
-      
-    return -1
-  
-  return sorted(moves, key=mvv_lva, reverse=True)
-
 def print_evaluation_stats(computer):
   moves_skipped = computer.total_moves_found - computer.moves_evaluated
   skipped_percentage = (moves_skipped / computer.total_moves_found) * 100 if computer.total_moves_found else 0
@@ -47,8 +32,33 @@ def print_evaluation_stats(computer):
   print(f"Moves Evaluated:          {computer.moves_evaluated}")
   print(f"Moves Skipped:            {moves_skipped} ({skipped_percentage:.2f}%)")
   print(f"Current Best Evaluation:  {computer.current_best_evaluation}")
-  print(
-    f"Branching Factor:         {computer.total_moves_found / computer.moves_evaluated:.2f}" if computer.moves_evaluated else "Branching Factor: N/A")
+  print(f"Depth Completed:          {computer.completed_depth}")
+  print(f"Quiescence Nodes:         {computer.quiescence_nodes}")
+  print(f"Quiescence Moves:         {computer.quiescence_moves_evaluated}")
+  print(f"Quiescence Delta Pruned:  {computer.quiescence_delta_pruned}")
+  print(f"Quiescence SEE Pruned:    {computer.quiescence_see_pruned}")
+  print(f"Beta Cutoffs:             {computer.beta_cutoffs}")
+
+  stats = computer.search_stats
+  if stats:
+    branching_factor = stats.effective_branching_factor()
+    print(f"Effective Branching:      {branching_factor:.2f}" if branching_factor else "Effective Branching:      N/A")
+    for iteration in stats.iterations:
+      cutoff_rate = iteration.first_move_cutoff_rate
+      print(
+        f"  depth {iteration.depth:<3} {iteration.nodes:>9} nodes {iteration.quiescence_nodes:>9} qnodes "
+        f"{iteration.elapsed:>7.2f}s  first-move cutoffs "
+        + (f"{cutoff_rate * 100:.1f}%" if cutoff_rate != None else "N/A")
+        + ("" if iteration.completed else "  (aborted)")
+      )
+
+  table = computer.transposition_table
+  probes = table.hits + table.misses
+  hit_percentage = (table.hits / probes) * 100 if probes else 0
+  print(f"TT Hits:                  {table.hits} ({hit_percentage:.2f}%)")
+  print(f"TT Misses:                {table.misses}")
+  print(f"TT Collisions:            {table.collisions}")
+  print(f"TT Fill Rate:             {table.get_fill_rate() * 100:.2f}%")
   print("--------------------------------\n")
 
 
@@ -56,3 +66,10 @@ def reset_evaluation_stats(computer):
   computer.moves_evaluated = 0
   computer.total_moves_found = 0
   computer.current_best_evaluation = 0
+  computer.beta_cutoffs = 0
+  computer.first_move_cutoffs = 0
+  computer.quiescence_nodes = 0
+  computer.quiescence_moves_evaluated = 0
+  computer.quiescence_delta_pruned = 0
+  computer.quiescence_see_pruned = 0
+  computer.transposition_table.reset_stats()
@@ -1,31 +1,280 @@
-from players.helper import evaluate_board, order_moves_mvv_lva
+import time
+
+from constants.pieces import MATERIAL_SCORES, PIECE_VALUES
+from game.moves import FLAG_EN_PASSANT, get_target_square, get_promotion
+from players.helper import evaluate_board
+from players.move_picker import MovePicker, order_captures, is_losing_capture
+from players.transposition_table import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from players.search_stats import SearchStats
+from game.profiler import Profiler
+
+
+# captures that can't bring the score within this margin of the window are skipped in quiescence
+DELTA_MARGIN = 200
+
+# being mated scores MATE_SCORE less the plies it takes, so a faster mate always scores higher
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000  # scores beyond this are mates, stored relative to the node in the TT
+
+# only results searched at least this deep are worth keeping across sessions; shallower ones are
+# quick to recompute and would crowd the deep ones out of the persistent cache
+PERSISTENT_CACHE_MIN_DEPTH = 3
+# scores are from white's point of view here and the side to move's in v1, so each has its own cache
+PERSISTENT_CACHE_TAG = 'minimax-v0'
+
+
+def score_to_table(score, ply):
+  """Mate scores count plies from the root; the table stores them counted from the node instead."""
+  if score > MATE_THRESHOLD:
+    return score + ply
+  if score < -MATE_THRESHOLD:
+    return score - ply
+  return score
+
+
+def score_from_table(score, ply):
+  if score > MATE_THRESHOLD:
+    return score - ply
+  if score < -MATE_THRESHOLD:
+    return score + ply
+  return score
 
 
 class ComputerPlayer:
-  def __init__(self, color):
+  def __init__(self, color, transposition_table_mb=16, persistent_cache=None):
     self.color = color
 
+    # kept for the lifetime of the player so results carry over between moves
+    self.transposition_table = TranspositionTable(transposition_table_mb)
+
+    # optional PersistentCache behind the transposition table, so results carry over between sessions
+    self.persistent_cache = persistent_cache
+
     self.moves_evaluated = 0
     self.total_moves_found = 0
     self.current_best_evaluation = 0
+    self.beta_cutoffs = 0
+    self.first_move_cutoffs = 0
+
+    # capture-only search at the leaves, counted separately from the main search
+    self.max_quiescence_depth = 8
+    self.quiescence_nodes = 0
+    self.quiescence_moves_evaluated = 0
+    self.quiescence_delta_pruned = 0
+    self.quiescence_see_pruned = 0
+
+    # search budget used by iterative_deepening, unlimited when minimax is called directly
+    self.search_deadline = None
+    self.node_limit = None
+    self.search_aborted = False
+    self.completed_depth = 0
+    self.root_key = None
+    self.root_ply = 0
+    self.root_best_move = None
+    self.search_stats = None
+
+    # debug mode: check the board's running evaluation against a full evaluate_board at every leaf
+    self.verify_evaluation = False
+
+  def iterative_deepening(self, game, is_maximizing, max_time=None, max_nodes=None, max_depth=64):
+    """Search depth 1, 2, 3... until the time (seconds) or node budget runs out.
+
+    Returns the (move, score) of the deepest iteration that finished; an iteration cut short
+    by the budget is thrown away. The first iteration always runs to completion so there is
+    always a move to play. Per-iteration statistics are left in self.search_stats.
+    """
+    start_time = time.perf_counter()
+    start_nodes = self.moves_evaluated
+    best_result = None
+    self.completed_depth = 0
+    self.root_key = game.board.zobrist_key
+    self.root_ply = game.ply
+    self.root_best_move = None
+    self.search_stats = SearchStats(self, game)
+
+    for depth in range(1, max_depth + 1):
+      self.search_deadline = start_time + max_time if max_time and best_result else None
+      # both budgets cover the whole search, not each iteration
+      self.node_limit = start_nodes + max_nodes if max_nodes and best_result else None
+      self.search_aborted = False
+
+      self.search_stats.start_iteration(depth)
+      result = self.minimax(depth, game, float('-inf'), float('inf'), is_maximizing)
+      completed = not self.search_aborted and result[0] != None
+      self.search_stats.end_iteration(result if completed else None, completed)
+      if not completed:
+        break
+
+      best_result = result
+      self.completed_depth = depth
+      self.root_best_move = result[0]
+
+      if max_time and time.perf_counter() - start_time >= max_time:
+        break
+      if max_nodes and self.moves_evaluated - start_nodes >= max_nodes:
+        break
+
+    self.search_deadline = None
+    self.node_limit = None
+    self.search_aborted = False
+    return best_result
+
+  def search(self, game, is_maximizing, max_time=None, max_nodes=None, max_depth=64):
+    """iterative_deepening, returning (move, score, SearchStats)."""
+    move, score = self.iterative_deepening(game, is_maximizing, max_time, max_nodes, max_depth) or (None, None)
+    return (move, score, self.search_stats)
+
+  def evaluate(self, game):
+    score = game.board.evaluate()
+
+    if self.verify_evaluation:
+      expected_score = evaluate_board(game.board.bitboard)
+      if score != expected_score:
+        raise AssertionError(f"Incremental evaluation {score} does not match evaluate_board {expected_score}")
+
+    return score
+
+  def mated_score(self, game, is_maximizing):
+    """Score of the side to move being checkmated, from white's point of view, nearer mates scoring more."""
+    ply = game.ply - self.root_ply
+    return -(MATE_SCORE - ply) if is_maximizing else MATE_SCORE - ply
+
+  def out_of_budget(self):
+    if self.search_deadline != None and time.perf_counter() >= self.search_deadline:
+      self.search_aborted = True
+    if self.node_limit != None and self.moves_evaluated >= self.node_limit:
+      self.search_aborted = True
 
+    return self.search_aborted
+
+  def probe_persistent_cache(self, key, entry):
+    """Look for a deeper result than the transposition table entry in the persistent cache.
+
+    Earlier iterations fill the table with shallow results first, so the cache is asked whenever
+    the table can't answer for the full depth. A deeper result found is copied into the table.
+    """
+    cached = self.persistent_cache.probe(key)
+    if cached == None or (entry != None and cached[0] <= entry[0]):
+      return entry
+
+    self.transposition_table.store(key, *cached)
+    return cached
+
+  @Profiler.profile_function
+  def quiescence(self, game, alpha, beta, is_maximizing, quiescence_depth=0):
+    """Resolve pending captures so the static evaluation isn't taken in the middle of an exchange."""
+    self.quiescence_nodes += 1
+
+    # checkmate would otherwise go unnoticed here; a side in check that has a legal move still
+    # stands pat below and only tries captures, so quiet evasions aren't searched
+    if game.king_in_check(game.current_player_color) and not game.has_legal_move():
+      return self.mated_score(game, is_maximizing)
+
+    # stand pat: the side to move can decline every capture and keep the static score
+    best_score = self.evaluate(game)
+    if quiescence_depth >= self.max_quiescence_depth or self.out_of_budget():
+      return best_score
+
+    if is_maximizing:
+      if best_score >= beta:
+        return best_score
+      alpha = max(alpha, best_score)
+    else:
+      if best_score <= alpha:
+        return best_score
+      beta = min(beta, best_score)
+
+    stand_pat = best_score
+    captures = order_captures(game.get_legal_moves(captures=True), game.board)
+
+    for move in captures:
+      # delta pruning: skip captures that can't reach the window even if the piece is won for free
+      if move & FLAG_EN_PASSANT:
+        gain = PIECE_VALUES['P']
+      else:
+        gain = abs(MATERIAL_SCORES[game.board.mailbox[get_target_square(move)]])
+      if get_promotion(move):
+        gain += PIECE_VALUES['Q'] - PIECE_VALUES['P']
+
+      if (is_maximizing and stand_pat + gain + DELTA_MARGIN <= alpha) or (not is_maximizing and stand_pat - gain - DELTA_MARGIN >= beta):
+        self.quiescence_delta_pruned += 1
+        continue
+
+      # a capture that loses material once the exchange is played out can't beat standing pat
+      if is_losing_capture(move, game.board):
+        self.quiescence_see_pruned += 1
+        continue
+
+      game.make_move(move)
+      self.quiescence_moves_evaluated += 1
+      current_score = self.quiescence(game, alpha, beta, not is_maximizing, quiescence_depth + 1)
+      game.undo_move()
+
+      if self.search_aborted:
+        return best_score
+
+      if is_maximizing and current_score > best_score:
+        best_score = current_score
+        alpha = max(alpha, best_score)
+
+      if not is_maximizing and current_score < best_score:
+        best_score = current_score
+        beta = min(beta, best_score)
+
+      if beta <= alpha:
+        break
+
+    return best_score
+
+  @Profiler.profile_function
   def minimax(self, depth, game, alpha, beta, is_maximizing):
-    if depth == 0 or game.is_checkmate():
-      return evaluate_board(game.board.bitboard)
+    if depth == 0:
+      return self.quiescence(game, alpha, beta, is_maximizing)
+
+    if self.out_of_budget():
+      return (None, 0)
+
+    key = game.board.zobrist_key
+    ply = game.ply - self.root_ply
+    original_alpha, original_beta = alpha, beta
+
+    hash_move = None
+    entry = self.transposition_table.probe(key)
+    if depth >= PERSISTENT_CACHE_MIN_DEPTH and self.persistent_cache != None and (entry == None or entry[0] < depth):
+      entry = self.probe_persistent_cache(key, entry)
+    if entry:
+      entry_depth, entry_score, entry_bound, hash_move = entry
+      if entry_depth >= depth and hash_move != None:
+        entry_score = score_from_table(entry_score, ply)
+        if entry_bound == EXACT:
+          return (hash_move, entry_score)
+        if entry_bound == LOWER_BOUND:
+          alpha = max(alpha, entry_score)
+        if entry_bound == UPPER_BOUND:
+          beta = min(beta, entry_score)
+        if beta <= alpha:
+          return (hash_move, entry_score)
+
+    # fall back on the previous iteration's choice when the root entry was overwritten
+    if hash_move == None and key == self.root_key:
+      hash_move = self.root_best_move
 
     best_move = None
     best_score = float("-inf") if is_maximizing else float("inf")
 
-    moves = game.get_all_moves()
-    moves = order_moves_mvv_lva(moves, game.board)
-    self.total_moves_found += len(moves)
+    # the best move from an earlier search of this position is the most likely cutoff, so it
+    # goes first and the rest are only generated if it doesn't cut off
+    move_picker = MovePicker(game, hash_move)
 
-    for move in moves:
+    for index, move in enumerate(move_picker):
       game.make_move(move)
       self.moves_evaluated += 1
       result = self.minimax(depth - 1, game, alpha, beta, not is_maximizing)
       game.undo_move()
 
+      if self.search_aborted:
+        return (best_move, best_score)
+
       current_score = result if isinstance(result, (int, float)) else result[1]
 
       if is_maximizing:
@@ -43,6 +292,25 @@ class ComputerPlayer:
       self.current_best_evaluation = best_score
 
       if beta <= alpha:
+        self.beta_cutoffs += 1
+        if index == 0:
+          self.first_move_cutoffs += 1
         break
 
+    self.total_moves_found += move_picker.moves_generated
+
+    # no legal move: checkmate or stalemate
+    if best_move == None:
+      return (None, self.mated_score(game, is_maximizing) if game.king_in_check(game.current_player_color) else 0)
+
+    if best_score <= original_alpha:
+      bound = UPPER_BOUND
+    elif best_score >= original_beta:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    self.transposition_table.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+    if depth >= PERSISTENT_CACHE_MIN_DEPTH and self.persistent_cache != None:
+      self.persistent_cache.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+
     return (best_move, best_score)
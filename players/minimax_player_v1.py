@@ -0,0 +1,256 @@
+from constants.pieces import MATERIAL_SCORES, PIECE_VALUES
+from game.moves import FLAG_CAPTURE, FLAG_EN_PASSANT, get_from_square, get_target_square, get_promotion
+from players.minimax_player_v0 import (
+  ComputerPlayer as ComputerPlayerV0, DELTA_MARGIN, MATE_SCORE, MATE_THRESHOLD, PERSISTENT_CACHE_MIN_DEPTH,
+  score_to_table, score_from_table
+)
+from players.transposition_table import EXACT, LOWER_BOUND, UPPER_BOUND
+from players.move_picker import MovePicker, order_captures, is_losing_capture
+from game.profiler import Profiler
+
+
+INFINITY = 1000000
+
+MAX_SEARCH_PLY = 128
+
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# late move reductions: quiet moves searched after the first few are searched one ply shallower
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+
+PERSISTENT_CACHE_TAG = 'minimax-v1'
+
+
+class ComputerPlayer(ComputerPlayerV0):
+  """Negamax engine with principal variation search, killer/history ordering, null-move pruning
+  and late move reductions.
+
+  Exposes the same minimax(depth, game, alpha, beta, is_maximizing) entry point and counters as
+  v0, with scores from white's point of view, so the two can be benchmarked against each other.
+  Internally every score is from the point of view of the side to move.
+  """
+
+  def __init__(self, color, transposition_table_mb=16, persistent_cache=None):
+    super().__init__(color, transposition_table_mb, persistent_cache)
+
+    self.killer_moves = [[None, None] for _ in range(MAX_SEARCH_PLY)]
+    self.history = [[0] * 64 for _ in range(64)]
+    self.search_best_move = None
+
+    self.null_move_cutoffs = 0
+    self.reduced_searches = 0
+    self.reduction_researches = 0
+
+  def iterative_deepening(self, game, is_maximizing, max_time=None, max_nodes=None, max_depth=64):
+    self.clear_move_ordering()
+    return super().iterative_deepening(game, is_maximizing, max_time, max_nodes, max_depth)
+
+  def clear_move_ordering(self):
+    for killers in self.killer_moves:
+      killers[0] = killers[1] = None
+    for from_history in self.history:
+      for target_pos in range(64):
+        from_history[target_pos] = 0
+
+  def minimax(self, depth, game, alpha, beta, is_maximizing):
+    sign = 1 if is_maximizing else -1
+
+    # translate the window from white's point of view to the side to move's
+    alpha, beta = (alpha, beta) if is_maximizing else (-beta, -alpha)
+    alpha = int(max(alpha, -INFINITY))
+    beta = int(min(beta, INFINITY))
+
+    self.search_best_move = None
+    score = self.negamax(depth, game, alpha, beta, 0)
+    self.current_best_evaluation = sign * score
+
+    return (self.search_best_move, sign * score)
+
+  def evaluate_side_to_move(self, game):
+    score = self.evaluate(game)
+    return score if game.current_player_color == 0 else -score
+
+  def has_non_pawn_material(self, board, color):
+    offset = 0 if color == 0 else 6
+    return board.bitboard[offset + 1] | board.bitboard[offset + 2] | board.bitboard[offset + 3] | board.bitboard[offset + 4]
+
+  @Profiler.profile_function
+  def negamax(self, depth, game, alpha, beta, ply, allow_null_move=True):
+    if depth <= 0:
+      return self.quiescence(game, alpha, beta, ply)
+
+    if self.out_of_budget():
+      return 0
+
+    board = game.board
+    color = game.current_player_color
+    in_check = game.king_in_check(color)
+    key = board.zobrist_key
+    original_alpha = alpha
+
+    hash_move = None
+    entry = self.transposition_table.probe(key)
+    if depth >= PERSISTENT_CACHE_MIN_DEPTH and self.persistent_cache != None and (entry == None or entry[0] < depth):
+      entry = self.probe_persistent_cache(key, entry)
+    if entry:
+      entry_depth, entry_score, entry_bound, hash_move = entry
+      if entry_depth >= depth and ply > 0:
+        entry_score = score_from_table(entry_score, ply)
+        if entry_bound == EXACT:
+          return entry_score
+        if entry_bound == LOWER_BOUND and entry_score >= beta:
+          return entry_score
+        if entry_bound == UPPER_BOUND and entry_score <= alpha:
+          return entry_score
+
+    if hash_move == None and ply == 0:
+      hash_move = self.root_best_move
+
+    # null move: if passing still fails high, a real move surely would (unsound in zugzwang,
+    # hence skipped when only pawns are left)
+    if (allow_null_move and ply > 0 and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+        and beta < MATE_THRESHOLD and self.has_non_pawn_material(board, color)):
+      game.make_null_move()
+      score = -self.negamax(depth - 1 - NULL_MOVE_REDUCTION, game, -beta, -beta + 1, ply + 1, False)
+      game.undo_null_move()
+
+      if self.search_aborted:
+        return 0
+
+      if score >= beta:
+        self.null_move_cutoffs += 1
+        return beta
+
+    killers = self.killer_moves[ply]
+    move_picker = MovePicker(game, hash_move, killers, self.history)
+
+    best_move = None
+    best_score = -INFINITY
+    legal_moves = 0
+
+    # bound methods looked up once per node rather than once per move
+    make_move = game.make_move
+    undo_move = game.undo_move
+    king_in_check = game.king_in_check
+
+    for move in move_picker:
+      make_move(move)
+      legal_moves += 1
+      self.moves_evaluated += 1
+      is_quiet = not (move & (FLAG_CAPTURE | FLAG_EN_PASSANT)) and not get_promotion(move)
+
+      if legal_moves == 1:
+        score = -self.negamax(depth - 1, game, -beta, -alpha, ply + 1)
+      else:
+        reduction = 0
+        if (legal_moves > LMR_MIN_MOVES and depth >= LMR_MIN_DEPTH and is_quiet and not in_check
+            and move != killers[0] and move != killers[1] and not king_in_check(1 - color)):
+          reduction = 1
+          self.reduced_searches += 1
+
+        # principal variation search: prove the move is worse with a null window, re-search if it isn't
+        score = -self.negamax(depth - 1 - reduction, game, -alpha - 1, -alpha, ply + 1)
+        if reduction and score > alpha:
+          self.reduction_researches += 1
+          score = -self.negamax(depth - 1, game, -alpha - 1, -alpha, ply + 1)
+        if alpha < score < beta:
+          score = -self.negamax(depth - 1, game, -beta, -alpha, ply + 1)
+
+      undo_move()
+
+      if self.search_aborted:
+        return 0
+
+      if score > best_score:
+        best_score = score
+        best_move = move
+        alpha = max(alpha, score)
+
+      if alpha >= beta:
+        self.beta_cutoffs += 1
+        if legal_moves == 1:
+          self.first_move_cutoffs += 1
+        if is_quiet:
+          if move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
+          self.history[get_from_square(move)][get_target_square(move)] += depth * depth
+        break
+
+    self.total_moves_found += move_picker.moves_generated
+
+    if legal_moves == 0:
+      return -MATE_SCORE + ply if in_check else 0
+
+    if best_score <= original_alpha:
+      bound = UPPER_BOUND
+    elif best_score >= beta:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    self.transposition_table.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+    if depth >= PERSISTENT_CACHE_MIN_DEPTH and self.persistent_cache != None:
+      self.persistent_cache.store(key, depth, score_to_table(best_score, ply), bound, best_move)
+
+    if ply == 0:
+      self.search_best_move = best_move
+
+    return best_score
+
+  @Profiler.profile_function
+  def quiescence(self, game, alpha, beta, ply, quiescence_depth=0):
+    self.quiescence_nodes += 1
+
+    # standing pat would hide a mate delivered on the last ply of the main search
+    if game.king_in_check(game.current_player_color) and not game.has_legal_move():
+      return -MATE_SCORE + ply
+
+    best_score = self.evaluate_side_to_move(game)
+    if quiescence_depth >= self.max_quiescence_depth or self.out_of_budget():
+      return best_score
+
+    if best_score >= beta:
+      return best_score
+    alpha = max(alpha, best_score)
+
+    stand_pat = best_score
+    board = game.board
+    captures = order_captures(game.get_legal_moves(captures=True), board)
+    mailbox = board.mailbox
+    make_move = game.make_move
+    undo_move = game.undo_move
+
+    for move in captures:
+      if move & FLAG_EN_PASSANT:
+        gain = PIECE_VALUES['P']
+      else:
+        gain = abs(MATERIAL_SCORES[mailbox[get_target_square(move)]])
+      if get_promotion(move):
+        gain += PIECE_VALUES['Q'] - PIECE_VALUES['P']
+
+      if stand_pat + gain + DELTA_MARGIN <= alpha:
+        self.quiescence_delta_pruned += 1
+        continue
+
+      if is_losing_capture(move, board):
+        self.quiescence_see_pruned += 1
+        continue
+
+      make_move(move)
+      self.quiescence_moves_evaluated += 1
+      score = -self.quiescence(game, -beta, -alpha, ply + 1, quiescence_depth + 1)
+      undo_move()
+
+      if self.search_aborted:
+        return best_score
+
+      if score > best_score:
+        best_score = score
+        alpha = max(alpha, score)
+
+      if alpha >= beta:
+        break
+
+    return best_score
@@ -0,0 +1,97 @@
+from constants.pieces import MATERIAL_SCORES, PIECE_VALUES
+from game.moves import FLAG_CAPTURE, FLAG_EN_PASSANT
+
+
+# value of the piece on a square for MVV-LVA, indexed by mailbox entry; an empty target square
+# (EMPTY_SQUARE, the last entry) can only be an en passant capture, which takes a pawn
+CAPTURE_VALUES = [abs(score) for score in MATERIAL_SCORES] + [PIECE_VALUES['P']]
+
+
+def is_losing_capture(move, board):
+  """Whether a capture loses material once the exchange on its square is played out.
+
+  Taking a piece worth at least the capturing one can't lose, so SEE only runs for the rest.
+  """
+  mailbox = board.mailbox
+  if CAPTURE_VALUES[mailbox[(move >> 6) & 63]] >= CAPTURE_VALUES[mailbox[move & 63]]:
+    return False
+  return board.see(move) < 0
+
+
+def order_captures(moves, board):
+  """Sort captures by most valuable victim, then least valuable attacker (MVV-LVA)."""
+  mailbox = board.mailbox
+  return sorted(
+    moves,
+    key=lambda move: 10 * CAPTURE_VALUES[mailbox[(move >> 6) & 63]] - CAPTURE_VALUES[mailbox[move & 63]],
+    reverse=True
+  )
+
+
+class MovePicker:
+  """Yields the legal moves of a position in stages, generating each stage only once it is reached.
+
+  The stages are the hash move, captures that don't lose material (by static exchange
+  evaluation) ordered by order_captures, the killer moves, the remaining quiet moves ordered
+  by history score, and last the losing captures. A node that cuts off on the hash move or a
+  capture never generates or sorts its quiet moves.
+  """
+
+  def __init__(self, game, hash_move=None, killers=(), history=None):
+    self.game = game
+    self.hash_move = hash_move
+    self.killers = killers
+    self.history = history
+
+    # moves generated so far, for the search statistics; each move counts once, whether it came
+    # from a generated stage or was tried earlier as the hash move or a killer
+    self.moves_generated = 0
+
+  def __iter__(self):
+    game = self.game
+    hash_move = self.hash_move
+    killers = self.killers
+    legal_masks = game.get_legal_masks()
+
+    # the hash move may come from another position sharing the table slot, so it is checked first
+    if hash_move != None and game.is_legal_move(hash_move, legal_masks):
+      self.moves_generated += 1
+      yield hash_move
+    else:
+      hash_move = None
+    hash_move_is_capture = hash_move != None and hash_move & (FLAG_CAPTURE | FLAG_EN_PASSANT) != 0
+
+    # the buffer of this ply stays untouched while the moves yielded are searched one ply deeper
+    moves = game.move_buffers[game.ply]
+    board = game.board
+    count = game.generate_moves(moves, captures=True, legal_masks=legal_masks)
+    self.moves_generated += count - hash_move_is_capture
+    losing_captures = []
+    for move in order_captures(moves[:count], board):
+      if move == hash_move:
+        continue
+      if is_losing_capture(move, board):
+        losing_captures.append(move)
+      else:
+        yield move
+
+    killers_tried = 0
+    for killer in killers:
+      if (killer != None and killer != hash_move and not killer & (FLAG_CAPTURE | FLAG_EN_PASSANT)
+          and game.is_legal_move(killer, legal_masks)):
+        self.moves_generated += 1
+        killers_tried += 1
+        yield killer
+
+    count = game.generate_moves(moves, captures=False, legal_masks=legal_masks)
+    self.moves_generated += count - killers_tried - (hash_move != None and not hash_move_is_capture)
+    quiet_moves = moves[:count]
+    if self.history:
+      history = self.history
+      quiet_moves = sorted(quiet_moves, key=lambda move: history[move & 63][(move >> 6) & 63], reverse=True)
+
+    for move in quiet_moves:
+      if move != hash_move and move not in killers:
+        yield move
+
+    yield from losing_captures
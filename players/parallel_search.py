@@ -0,0 +1,183 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from game.game import Game
+from game.moves import FLAG_CAPTURE, FLAG_EN_PASSANT, get_promotion
+from players.minimax_player_v1 import ComputerPlayer, INFINITY, LMR_MIN_DEPTH, LMR_MIN_MOVES, PERSISTENT_CACHE_TAG
+from players.persistent_cache import PersistentCache
+from players.transposition_table import EXACT
+
+
+# per-process search state, created once by the pool initializer and reused for every task
+_worker_game = None
+_worker_player = None
+_shared_alpha = None
+
+
+def init_worker(shared_alpha, transposition_table_mb, persistent_cache_file=None):
+  global _worker_game, _worker_player, _shared_alpha
+  _worker_game = Game()
+  # workers only read the cache; the process that owns the pool is the one that writes it
+  persistent_cache = PersistentCache(persistent_cache_file, tag=PERSISTENT_CACHE_TAG, read_only=True) if persistent_cache_file else None
+  _worker_player = ComputerPlayer(None, transposition_table_mb, persistent_cache)
+  _shared_alpha = shared_alpha
+
+
+def search_root_move(snapshot, move, depth, deadline, reducible=False):
+  """Search a single root move in a worker process.
+
+  The move is searched against the best root score any worker has proven so far, and raises
+  that shared bound when it beats it. Once there is a bound, the move is searched the way the
+  serial principal variation search does: a null window around the bound, a ply shallower for
+  a reducible late quiet move that doesn't give check, and the full depth and window only when
+  the move beats the bound. The deadline is wall-clock time, as it has to mean the
+  same thing in every process. Returns (move, score, alpha searched with, aborted, nodes),
+  with the score from the root side's point of view, or a score of None for an illegal move.
+  """
+  game = _worker_game
+  player = _worker_player
+  game.load_snapshot(snapshot)
+
+  game.make_move(move)
+  if game.king_in_check(1 - game.current_player_color):
+    return (move, None, -INFINITY, False, 0)
+
+  nodes_before = player.moves_evaluated
+  player.search_deadline = time.perf_counter() + (deadline - time.time()) if deadline != None else None
+  player.search_aborted = False
+
+  alpha = _shared_alpha.value
+  if alpha == -INFINITY:
+    score = -player.negamax(depth - 1, game, -INFINITY, INFINITY, 1)
+  else:
+    reduction = 1 if reducible and not game.king_in_check(game.current_player_color) else 0
+    if reduction:
+      player.reduced_searches += 1
+    score = -player.negamax(depth - 1 - reduction, game, -alpha - 1, -alpha, 1)
+    if reduction and score > alpha and not player.search_aborted:
+      player.reduction_researches += 1
+      score = -player.negamax(depth - 1, game, -alpha - 1, -alpha, 1)
+    if score > alpha and not player.search_aborted:
+      score = -player.negamax(depth - 1, game, -INFINITY, -alpha, 1)
+  aborted = player.search_aborted
+
+  player.search_deadline = None
+  player.search_aborted = False
+
+  if not aborted and score > alpha:
+    with _shared_alpha.get_lock():
+      if score > _shared_alpha.value:
+        _shared_alpha.value = score
+
+  return (move, score, alpha, aborted, player.moves_evaluated - nodes_before + 1)
+
+
+class ParallelSearch:
+  """Splits the root moves of a v1 search across a pool of worker processes.
+
+  The first move (the previous iteration's best) is searched alone to establish a bound, then
+  the remaining moves are farmed out together, all workers sharing the best score found so far
+  as their alpha. A move searched with a stale bound that fails low is never taken as best: only
+  scores that beat the alpha they were searched with are exact.
+  """
+
+  def __init__(self, workers=None, transposition_table_mb=16, persistent_cache_file=None, persistent_cache_mb=32):
+    self.workers = workers or os.cpu_count()
+    self.shared_alpha = multiprocessing.Value('i', -INFINITY)
+    self.executor = ProcessPoolExecutor(
+      max_workers=self.workers,
+      initializer=init_worker,
+      initargs=(self.shared_alpha, transposition_table_mb, persistent_cache_file)
+    )
+
+    # root results of every completed iteration, so the next session starts from the best move found
+    self.persistent_cache = PersistentCache(persistent_cache_file, persistent_cache_mb, PERSISTENT_CACHE_TAG) if persistent_cache_file else None
+
+    self.moves_evaluated = 0
+    self.total_moves_found = 0
+    self.current_best_evaluation = 0
+    self.completed_depth = 0
+
+  def shutdown(self):
+    self.executor.shutdown(cancel_futures=True)
+    if self.persistent_cache:
+      self.persistent_cache.close()
+
+  def search_root(self, game, depth, moves, deadline=None):
+    """Search every root move to depth, returning (best move, score, scores by move) or None if aborted."""
+    snapshot = game.get_snapshot()
+    self.shared_alpha.value = -INFINITY
+
+    # late quiet root moves are reduced as in the serial search; giving check is tested in the worker
+    reduce_late_moves = depth >= LMR_MIN_DEPTH and not game.king_in_check(game.current_player_color)
+
+    first_result = self.executor.submit(search_root_move, snapshot, moves[0], depth, deadline).result()
+    futures = [
+      self.executor.submit(
+        search_root_move, snapshot, move, depth, deadline,
+        reduce_late_moves and index >= LMR_MIN_MOVES
+        and not move & (FLAG_CAPTURE | FLAG_EN_PASSANT) and not get_promotion(move)
+      )
+      for index, move in enumerate(moves[1:], 1)
+    ]
+    results = [first_result] + [future.result() for future in futures]
+
+    best_move = None
+    best_score = -INFINITY
+    scores = {}
+    for move, score, alpha, aborted, nodes in results:
+      self.moves_evaluated += nodes
+      if aborted:
+        return None
+      if score == None:
+        continue
+
+      scores[move] = score
+      if score > alpha and score > best_score:
+        best_move, best_score = move, score
+
+    return (best_move, best_score, scores)
+
+  def iterative_deepening(self, game, is_maximizing, max_time=None, max_depth=64):
+    """Same contract as ComputerPlayer.iterative_deepening: (move, score from white's point of view)."""
+    start_time = time.time()
+    sign = 1 if is_maximizing else -1
+    # a list, as it is reordered between iterations
+    moves = list(game.get_legal_moves())
+    self.total_moves_found += len(moves)
+    self.completed_depth = 0
+    best_result = None
+
+    if not moves:
+      return None
+
+    # the file is created here, before the first task starts a worker that maps it
+    key = game.board.zobrist_key
+    entry = self.persistent_cache.probe(key) if self.persistent_cache else None
+    if entry and entry[3] in moves:
+      moves.remove(entry[3])
+      moves.insert(0, entry[3])
+
+    for depth in range(1, max_depth + 1):
+      # the first iteration always finishes so there is a move to play
+      deadline = start_time + max_time if max_time and best_result else None
+      result = self.search_root(game, depth, moves, deadline)
+      if result == None:
+        break
+
+      best_move, best_score, scores = result
+      best_result = (best_move, sign * best_score)
+      self.current_best_evaluation = sign * best_score
+      self.completed_depth = depth
+      if self.persistent_cache:
+        self.persistent_cache.store(key, depth, best_score, EXACT, best_move)
+
+      # best move first, the rest by how well they did this iteration
+      moves.sort(key=lambda move: (move == best_move, scores.get(move, -INFINITY)), reverse=True)
+
+      if max_time and time.time() - start_time >= max_time:
+        break
+
+    return best_result
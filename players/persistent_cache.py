@@ -0,0 +1,257 @@
+import os
+import mmap
+import atexit
+import struct
+
+try:
+  import fcntl
+except ImportError:  # not available on Windows, where writers simply aren't locked out of each other
+  fcntl = None
+
+
+# the file starts with a header, padded to HEADER_SIZE bytes so the records after it stay aligned
+FILE_MAGIC = b'CHSCACHE'
+FILE_VERSION = 1
+HEADER = struct.Struct('<8sIIQ16s')  # magic, version, generation, number of buckets, engine tag
+HEADER_SIZE = 64
+HEADER_WORDS = HEADER_SIZE // 8
+
+# A record is two 64-bit words: the entry packed into one int, and that int XORed with the key.
+# A record read while another process is halfway through writing it, or one belonging to a
+# different position, fails the check and reads as a miss. The entry is packed as:
+#   bits  0-19  best move, 0 if there is none (from and target square can't both be a8)
+#   bits 20-27  depth
+#   bits 28-29  bound
+#   bits 30-45  generation of the session that last stored or used the entry
+#   bits 46-63  score + SCORE_OFFSET
+RECORD_SIZE_BYTES = 16
+BUCKET_SIZE = 4
+BUCKET_BYTES = RECORD_SIZE_BYTES * BUCKET_SIZE
+
+NO_MOVE = 0
+MAX_DEPTH = 255
+GENERATION_MASK = 0xFFFF
+SCORE_OFFSET = 1 << 17
+GENERATION_SHIFT = 30
+SCORE_SHIFT = 46
+
+
+def pack_entry(depth, score, bound, move, generation):
+  return (
+    (NO_MOVE if move == None else move) | (depth << 20) | (bound << 28)
+    | (generation << GENERATION_SHIFT) | ((score + SCORE_OFFSET) << SCORE_SHIFT)
+  )
+
+
+def unpack_entry(data):
+  """Return the (depth, score, bound, move) packed in an entry, as TranspositionTable.probe does."""
+  move = data & 0xFFFFF
+  return (
+    (data >> 20) & 0xFF, (data >> SCORE_SHIFT) - SCORE_OFFSET, (data >> 28) & 3,
+    None if move == NO_MOVE else move
+  )
+
+
+class PersistentCache:
+  """Search results kept across sessions in a memory-mapped file of fixed-size records.
+
+  Entries are keyed by Zobrist key and hold the same (depth, score, bound, move) as the
+  transposition table. The file is sized once from the memory budget and never grows: each
+  bucket holds four entries and a new result replaces the one least recently used, by session
+  generation, and the shallower of those. Nothing is read until the first probe or store,
+  and the OS only pages in the parts of the file that are touched.
+
+  One process at a time may write, holding a lock on the file; any number may map it
+  read-only, and a writer that finds the lock taken opens read-only too. Records are written
+  in place, so flush() (called on close, and at exit) is all saving takes. The engine tag keeps
+  engines whose scores mean different things out of each other's files.
+  """
+
+  def __init__(self, path, size_mb=32, tag='', read_only=False):
+    self.path = path
+    self.size_mb = size_mb
+    self.tag = tag.encode()[:16]
+    self.read_only = read_only
+
+    self.opened = False
+    self.file = None
+    self.mmap = None
+    self.words = None  # the mapped file as 64-bit words, None while closed or unusable
+    self.bucket_mask = 0
+    self.generation = 0
+
+    self.reset_stats()
+
+  def reset_stats(self):
+    self.hits = 0
+    self.misses = 0
+    self.stores = 0
+
+  def open(self):
+    """Map the file, creating it when writable. Called by the first probe or store."""
+    if self.opened:
+      return
+    self.opened = True
+
+    try:
+      if self.read_only:
+        self.open_read_only()
+      else:
+        self.open_writable()
+    except FileNotFoundError:
+      # nothing saved yet; only a writer creates the file
+      self.close()
+    except OSError as error:
+      print(f"Persistent cache {self.path} unavailable: {error}")
+      self.close()
+
+  def open_read_only(self):
+    self.file = open(self.path, 'rb')
+    header = self.read_header()
+    if header == None:
+      self.close()
+      return
+
+    self.map_file(header[3], mmap.ACCESS_READ)
+    self.generation = header[2]
+
+  def open_writable(self):
+    self.file = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+
+    if fcntl != None:
+      try:
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+        # another session is writing; use what it has saved without touching it
+        self.file.close()
+        self.file = None
+        self.read_only = True
+        self.open_read_only()
+        return
+
+    header = self.read_header()
+    if header == None:
+      max_buckets = max(1, (self.size_mb * 1024 * 1024 - HEADER_SIZE) // BUCKET_BYTES)
+      num_buckets = 1 << (max_buckets.bit_length() - 1)
+      # truncating to nothing first zeroes every record of a file being replaced
+      self.file.truncate(0)
+      self.file.truncate(HEADER_SIZE + num_buckets * BUCKET_BYTES)
+      header = (FILE_MAGIC, FILE_VERSION, 0, num_buckets, self.tag)
+
+    # a new session, so entries it stores or uses count as more recent than everything else
+    self.generation = (header[2] + 1) & GENERATION_MASK
+    self.file.seek(0)
+    self.file.write(HEADER.pack(FILE_MAGIC, FILE_VERSION, self.generation, header[3], self.tag))
+    self.file.flush()
+
+    self.map_file(header[3], mmap.ACCESS_WRITE)
+    atexit.register(self.close)
+
+  def read_header(self):
+    """The header of the open file, or None if the file is empty or wasn't written for this engine."""
+    self.file.seek(0)
+    data = self.file.read(HEADER.size)
+    if len(data) < HEADER.size:
+      return None
+
+    header = HEADER.unpack(data)
+    magic, version, generation, num_buckets, tag = header
+    if (magic != FILE_MAGIC or version != FILE_VERSION or tag.rstrip(b'\0') != self.tag
+        or num_buckets & (num_buckets - 1)
+        or os.fstat(self.file.fileno()).st_size != HEADER_SIZE + num_buckets * BUCKET_BYTES):
+      return None
+    return header
+
+  def map_file(self, num_buckets, access):
+    self.mmap = mmap.mmap(self.file.fileno(), HEADER_SIZE + num_buckets * BUCKET_BYTES, access=access)
+    self.words = memoryview(self.mmap).cast('Q')
+    self.bucket_mask = num_buckets - 1
+
+  def flush(self):
+    if self.mmap != None and not self.read_only:
+      self.mmap.flush()
+
+  def close(self):
+    if self.words != None:
+      self.flush()
+      self.words.release()
+      self.words = None
+    if self.mmap != None:
+      self.mmap.close()
+      self.mmap = None
+    if self.file != None:
+      # closing the file also drops the writer's lock
+      self.file.close()
+      self.file = None
+
+  def probe(self, key):
+    """Return (depth, score, bound, move) stored for the key, or None if it isn't in the file."""
+    if not self.opened:
+      self.open()
+    words = self.words
+    if words == None:
+      return None
+
+    index = HEADER_WORDS + (key & self.bucket_mask) * BUCKET_SIZE * 2
+    for slot in range(index, index + BUCKET_SIZE * 2, 2):
+      data = words[slot + 1]
+      if words[slot] ^ data != key or data == 0:
+        continue
+
+      self.hits += 1
+      # used again this session, so it is the last entry of its bucket to be evicted
+      if not self.read_only and (data >> GENERATION_SHIFT) & GENERATION_MASK != self.generation:
+        data = (data & ~(GENERATION_MASK << GENERATION_SHIFT)) | (self.generation << GENERATION_SHIFT)
+        words[slot + 1] = data
+        words[slot] = key ^ data
+      return unpack_entry(data)
+
+    self.misses += 1
+    return None
+
+  def store(self, key, depth, score, bound, move):
+    if not self.opened:
+      self.open()
+    words = self.words
+    if words == None or self.read_only or not -SCORE_OFFSET <= score < SCORE_OFFSET:
+      return
+
+    generation = self.generation
+    index = HEADER_WORDS + (key & self.bucket_mask) * BUCKET_SIZE * 2
+    victim = None
+    victim_rank = None
+
+    for slot in range(index, index + BUCKET_SIZE * 2, 2):
+      data = words[slot + 1]
+      if data == 0:
+        victim = slot
+        break
+
+      if words[slot] ^ data == key:
+        # a deeper result for the same position is worth more than this one
+        if (data >> 20) & 0xFF > depth:
+          return
+        victim = slot
+        break
+
+      # oldest first, then shallowest
+      rank = ((generation - ((data >> GENERATION_SHIFT) & GENERATION_MASK)) & GENERATION_MASK, -((data >> 20) & 0xFF))
+      if victim_rank == None or rank > victim_rank:
+        victim, victim_rank = slot, rank
+
+    data = pack_entry(min(depth, MAX_DEPTH), score, bound, move, generation)
+    # the check word goes last, so a reader never sees it match a half-written entry
+    words[victim + 1] = data
+    words[victim] = key ^ data
+    self.stores += 1
+
+  def get_fill_rate(self):
+    """Fraction of entries in use, estimated from a sample of the file."""
+    if not self.opened:
+      self.open()
+    if self.words == None:
+      return 0.0
+
+    sample_size = min((self.bucket_mask + 1) * BUCKET_SIZE, 1000)
+    used = sum(1 for entry in range(sample_size) if self.words[HEADER_WORDS + entry * 2 + 1] != 0)
+    return used / sample_size
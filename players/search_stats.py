@@ -0,0 +1,168 @@
+import json
+import time
+
+from game.moves import move_to_uci
+
+
+# player counters that are sampled around every iteration; engines without one of them report 0
+SEARCH_COUNTERS = (
+  'moves_evaluated',
+  'total_moves_found',
+  'beta_cutoffs',
+  'first_move_cutoffs',
+  'quiescence_nodes',
+  'quiescence_moves_evaluated',
+  'quiescence_delta_pruned',
+  'quiescence_see_pruned',
+  'null_move_cutoffs',
+  'reduced_searches',
+  'reduction_researches',
+)
+
+TABLE_COUNTERS = ('hits', 'misses', 'collisions')
+
+
+class IterationStats:
+  """Counters for a single iteration of iterative deepening, as differences over the iteration."""
+
+  def __init__(self, depth):
+    self.depth = depth
+    self.counters = {}
+    self.elapsed = 0.0
+    self.best_move = None
+    self.score = None
+    self.completed = False
+
+  @property
+  def nodes(self):
+    return self.counters.get('moves_evaluated', 0)
+
+  @property
+  def quiescence_nodes(self):
+    return self.counters.get('quiescence_nodes', 0)
+
+  @property
+  def first_move_cutoff_rate(self):
+    """Share of beta cutoffs caused by the first move searched, the usual measure of ordering quality."""
+    cutoffs = self.counters.get('beta_cutoffs', 0)
+    return self.counters.get('first_move_cutoffs', 0) / cutoffs if cutoffs else None
+
+  @property
+  def tt_hit_rate(self):
+    probes = self.counters.get('tt_hits', 0) + self.counters.get('tt_misses', 0)
+    return self.counters.get('tt_hits', 0) / probes if probes else None
+
+  def to_dict(self):
+    result = {
+      'depth': self.depth,
+      'completed': self.completed,
+      'nodes': self.nodes,
+      'quiescence_nodes': self.quiescence_nodes,
+      'elapsed': round(self.elapsed, 6),
+      'nodes_per_second': round((self.nodes + self.quiescence_nodes) / self.elapsed, 1) if self.elapsed else None,
+      'first_move_cutoff_rate': self.first_move_cutoff_rate,
+      'tt_hit_rate': self.tt_hit_rate,
+      'best_move': move_to_uci(self.best_move) if self.best_move != None else None,
+      'score': self.score,
+    }
+    result.update(self.counters)
+    return result
+
+
+class SearchStats:
+  """Structured statistics of one search, broken down by iteration.
+
+  The player keeps its running counters; SearchStats only samples them at the start and end of
+  every iteration, so collecting it costs nothing inside the search itself.
+  """
+
+  def __init__(self, player, game):
+    self.engine = f"{type(player).__module__}.{type(player).__name__}"
+    self.root_key = game.board.zobrist_key
+    self.iterations = []
+    self.start_time = time.perf_counter()
+    self.elapsed = 0.0
+
+    self.player = player
+    self.iteration_start = None
+    self.counters_at_start = None
+
+  def sample_counters(self):
+    counters = {name: getattr(self.player, name, 0) for name in SEARCH_COUNTERS}
+    table = self.player.transposition_table
+    for name in TABLE_COUNTERS:
+      counters[f"tt_{name}"] = getattr(table, name)
+    return counters
+
+  def start_iteration(self, depth):
+    self.iterations.append(IterationStats(depth))
+    self.iteration_start = time.perf_counter()
+    self.counters_at_start = self.sample_counters()
+
+  def end_iteration(self, result, completed):
+    iteration = self.iterations[-1]
+    counters = self.sample_counters()
+    iteration.counters = {name: counters[name] - self.counters_at_start[name] for name in counters}
+    iteration.elapsed = time.perf_counter() - self.iteration_start
+    iteration.completed = completed
+    if result:
+      iteration.best_move, iteration.score = result
+
+    self.elapsed = time.perf_counter() - self.start_time
+
+  @property
+  def completed_iterations(self):
+    return [iteration for iteration in self.iterations if iteration.completed]
+
+  @property
+  def completed_depth(self):
+    completed = self.completed_iterations
+    return completed[-1].depth if completed else 0
+
+  @property
+  def total_nodes(self):
+    return sum(iteration.nodes + iteration.quiescence_nodes for iteration in self.iterations)
+
+  def effective_branching_factors(self):
+    """Node growth from one completed iteration to the next, by depth."""
+    completed = self.completed_iterations
+    return {
+      current.depth: current.nodes / previous.nodes
+      for previous, current in zip(completed, completed[1:])
+      if previous.nodes
+    }
+
+  def effective_branching_factor(self):
+    """Overall growth rate: the d-th root of the nodes of the deepest completed iteration."""
+    completed = self.completed_iterations
+    if not completed or completed[-1].nodes == 0:
+      return None
+    return completed[-1].nodes ** (1 / completed[-1].depth)
+
+  def to_dict(self):
+    return {
+      'engine': self.engine,
+      'root_key': f"{self.root_key:016x}",
+      'completed_depth': self.completed_depth,
+      'total_nodes': self.total_nodes,
+      'elapsed': round(self.elapsed, 6),
+      'effective_branching_factor': self.effective_branching_factor(),
+      'iterations': [iteration.to_dict() for iteration in self.iterations],
+    }
+
+  def to_json_lines(self, **extra):
+    """One JSON object per iteration, tagged with the engine and position so runs can be concatenated."""
+    branching_factors = self.effective_branching_factors()
+    lines = []
+    for iteration in self.iterations:
+      record = {'engine': self.engine, 'root_key': f"{self.root_key:016x}", **extra}
+      record.update(iteration.to_dict())
+      record['effective_branching_factor'] = branching_factors.get(iteration.depth)
+      lines.append(json.dumps(record))
+    return lines
+
+  def write_json_lines(self, path, **extra):
+    """Append the iterations of this search to a JSON lines file."""
+    with open(path, 'a') as file:
+      for line in self.to_json_lines(**extra):
+        file.write(line + '\n')
@@ -0,0 +1,84 @@
+from array import array
+
+# bound types, describing how a stored score relates to the true minimax value
+EXACT = 0
+LOWER_BOUND = 1  # search failed high, the true score is at least the stored score
+UPPER_BOUND = 2  # search failed low, the true score is at most the stored score
+
+NO_MOVE = -1
+EMPTY_DEPTH = -1
+
+# key (8) + score (4) + move (4) + depth (1) + bound (1)
+ENTRY_SIZE_BYTES = 18
+BUCKET_SIZE = 2
+
+
+class TranspositionTable:
+  """Fixed-size hash table of search results, keyed by the Zobrist key of the position.
+
+  Entries live in preallocated parallel arrays sized from a memory budget, so the table never
+  grows during a game. Each bucket holds two entries: the first is depth-preferred and only
+  gives way to results searched at least as deep, the second is always replaced.
+  """
+
+  def __init__(self, size_mb=16):
+    max_entries = max(BUCKET_SIZE, (size_mb * 1024 * 1024) // ENTRY_SIZE_BYTES)
+
+    # round down to a power of two number of buckets so the index is a mask of the key
+    num_buckets = 1 << ((max_entries // BUCKET_SIZE).bit_length() - 1)
+    self.bucket_mask = num_buckets - 1
+    self.num_entries = num_buckets * BUCKET_SIZE
+
+    self.keys = array('Q', bytes(8 * self.num_entries))
+    self.scores = array('i', bytes(4 * self.num_entries))
+    self.moves = array('i', [NO_MOVE]) * self.num_entries
+    self.depths = array('b', [EMPTY_DEPTH]) * self.num_entries
+    self.bounds = array('B', bytes(self.num_entries))
+
+    self.reset_stats()
+
+  def reset_stats(self):
+    self.hits = 0
+    self.misses = 0
+    self.collisions = 0  # misses where the bucket was filled by other positions
+
+  def clear(self):
+    for index in range(self.num_entries):
+      self.depths[index] = EMPTY_DEPTH
+      self.moves[index] = NO_MOVE
+
+  def probe(self, key):
+    """Return (depth, score, bound, move) stored for the key, or None if it isn't in the table."""
+    index = (key & self.bucket_mask) * BUCKET_SIZE
+
+    for slot in range(index, index + BUCKET_SIZE):
+      if self.keys[slot] == key and self.depths[slot] != EMPTY_DEPTH:
+        self.hits += 1
+        move = self.moves[slot]
+        return (self.depths[slot], self.scores[slot], self.bounds[slot], None if move == NO_MOVE else move)
+
+    self.misses += 1
+    if self.depths[index] != EMPTY_DEPTH:
+      self.collisions += 1
+
+    return None
+
+  def store(self, key, depth, score, bound, move):
+    index = (key & self.bucket_mask) * BUCKET_SIZE
+
+    # keep the deeper result in the first slot, anything else goes to the always-replace slot
+    slot = index
+    if self.keys[index] != key and self.depths[index] > depth:
+      slot = index + 1
+
+    self.keys[slot] = key
+    self.depths[slot] = depth
+    self.scores[slot] = score
+    self.bounds[slot] = bound
+    self.moves[slot] = NO_MOVE if move == None else move
+
+  def get_fill_rate(self):
+    """Fraction of entries in use, estimated from a sample of the table."""
+    sample_size = min(self.num_entries, 1000)
+    used = sum(1 for index in range(sample_size) if self.depths[index] != EMPTY_DEPTH)
+    return used / sample_size
@@ -6,20 +6,43 @@ from PyQt6.QtGui import QPixmap, QKeyEvent
 from playsound import playsound
 
 from game.game import Game
+from game.moves import get_from_square, get_target_square
 from game.profiler import Profiler
 from constants.pieces import PIECE_IMAGES
-from players.minimax_player_v0 import ComputerPlayer
+from players.minimax_player_v0 import ComputerPlayer, PERSISTENT_CACHE_TAG
+from players.minimax_player_v1 import PERSISTENT_CACHE_TAG as PARALLEL_PERSISTENT_CACHE_TAG
+from players.parallel_search import ParallelSearch
+from players.persistent_cache import PersistentCache
 from players.helper import reset_evaluation_stats, print_evaluation_stats
 
 
-SEARCH_DEPTH = 4
+# the engine deepens its search until one of these budgets runs out
+SEARCH_TIME_SECONDS = 3.0
+SEARCH_MAX_DEPTH = 64
+TRANSPOSITION_TABLE_MB = 64
+
+# 0 searches on a background thread in this process, otherwise root moves are split across this many processes
+PARALLEL_SEARCH_WORKERS = 0
+
+# search results are kept in this file between sessions, one per engine ({tag}); None starts every session cold
+PERSISTENT_CACHE_FILE = 'search_cache_{tag}.bin'
+PERSISTENT_CACHE_MB = 32
 
 
 class GameWindow(QWidget):
   def __init__(self):
     super().__init__()
     self.game = Game()
-    self.computer = ComputerPlayer("black")
+    # the file isn't opened until the computer first searches
+    self.persistent_cache = None
+    if PERSISTENT_CACHE_FILE:
+      self.persistent_cache = PersistentCache(PERSISTENT_CACHE_FILE.format(tag=PERSISTENT_CACHE_TAG), PERSISTENT_CACHE_MB, PERSISTENT_CACHE_TAG)
+    self.computer = ComputerPlayer("black", TRANSPOSITION_TABLE_MB, self.persistent_cache)
+
+    self.parallel_search = None
+    if PARALLEL_SEARCH_WORKERS:
+      parallel_cache_file = PERSISTENT_CACHE_FILE.format(tag=PARALLEL_PERSISTENT_CACHE_TAG) if PERSISTENT_CACHE_FILE else None
+      self.parallel_search = ParallelSearch(PARALLEL_SEARCH_WORKERS, TRANSPOSITION_TABLE_MB, parallel_cache_file, PERSISTENT_CACHE_MB)
     self.ai_thinking = False
 
     self.labels = [None] * 64
@@ -32,7 +55,7 @@ class GameWindow(QWidget):
     self.valid_moves = []
 
   def create_window(self):
-    self.setWindowTitle(f'Chess Minimax v2 - Depth ({SEARCH_DEPTH})')
+    self.setWindowTitle(f'Chess Minimax v2 - Time ({SEARCH_TIME_SECONDS}s)')
     self.setWindowFlags(self.windowFlags() | Qt.WindowType.WindowStaysOnTopHint)
 
     grid = QGridLayout()
@@ -70,10 +93,15 @@ class GameWindow(QWidget):
         self.labels[square].clear()
 
   def multithread_minimax(self):
-    move = self.computer.minimax(SEARCH_DEPTH, self.game, float('-inf'), float('inf'), False)[0]
+    searcher = self.parallel_search or self.computer
+    move = searcher.iterative_deepening(
+      self.game, False, max_time=SEARCH_TIME_SECONDS, max_depth=SEARCH_MAX_DEPTH
+    )[0]
     move_type = self.game.make_move(move)
     if self.game.is_checkmate():
       print("checkmate")
+    elif self.game.is_stalemate():
+      print("stalemate")
 
     # refactor later with all the different move types
     if move_type == "capture" or move_type == "en-passant":
@@ -82,10 +110,15 @@ class GameWindow(QWidget):
       playsound("assets/sounds/move-self.mp3")
 
     self.ai_thinking = False
-    self.prev_squares = move
+    self.prev_squares = [get_from_square(move), get_target_square(move)]
     self.display_pieces()
     self.reset_selection()
+    if self.parallel_search:
+      print(f"Parallel search: depth {self.parallel_search.completed_depth}, {self.parallel_search.moves_evaluated} moves evaluated")
+      return
+
     Profiler.print_profile_summary(self.computer.moves_evaluated)
+    Profiler().reset_profiler()
     print_evaluation_stats(self.computer)
     reset_evaluation_stats(self.computer)
 
@@ -99,9 +132,12 @@ class GameWindow(QWidget):
       piece_type = self.game.board.get_square_piece(square_index)
 
       if self.selected_piece != None and square_index in self.valid_moves:
-        move_type = self.game.make_move((self.selected_square, square_index))
-        if self.game.king_in_check(1 - self.game.current_player_color):
-          self.game.undo_move()
+        move = self.game.find_move(self.selected_square, square_index)
+        if move == None:  # the move would leave our king in check
+          self.reset_selection()
+          return
+
+        move_type = self.game.make_move(move)
 
         # refactor later with all the different move types
         if move_type == "capture" or move_type == "en-passant":
@@ -116,6 +152,9 @@ class GameWindow(QWidget):
         if self.game.is_checkmate():
           print("checkmate")
           return
+        if self.game.is_stalemate():
+          print("stalemate")
+          return
 
         self.ai_thinking = True
         threading.Thread(target=self.multithread_minimax).start()
@@ -131,7 +170,7 @@ class GameWindow(QWidget):
   def generate_valid_moves(self, piece_type, position):
     self.selected_piece = piece_type
     self.selected_square = position
-    self.valid_moves = self.game.board.generate_moves(piece_type, position)
+    self.valid_moves = [(move >> 6) & 63 for move in self.game.get_legal_moves() if move & 63 == position]
     self.show_valid_moves()
 
   def show_valid_moves(self):
@@ -145,6 +184,13 @@ class GameWindow(QWidget):
     self.selected_square = None
     self.reset_highlight()
 
+  def closeEvent(self, event):
+    if self.parallel_search:
+      self.parallel_search.shutdown()
+    if self.persistent_cache:
+      self.persistent_cache.close()
+    super().closeEvent(event)
+
   def eventFilter(self, obj, event):
     """Event filter to handle key press for 'u'."""
     if event.type() == QKeyEvent.Type.KeyPress: